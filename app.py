@@ -2,12 +2,16 @@ import streamlit as st
 from pages_public import LogIn, Register
 from pages_private import Dashboard, Finance_Hub
 from database.database import init_db
+from services.price_refresher import start_background_refresher
 from utils.auth import logout
 from utils.styles import load_css
 
 # --- Initialize DB ---
 init_db()
 
+# --- Background price refresh (once per process) ---
+start_background_refresher()
+
 # --- Load CSS ---
 load_css()
 
@@ -0,0 +1,72 @@
+# benchmarks/bench_parser.py
+"""
+Parser micro-benchmark over the saved search / product page fixtures.
+
+    python -m benchmarks.bench_parser [--repeat 20]
+
+Compares the old path (full html.parser soup) with the C parser and with
+parsing restricted to the product-item / comparison-table subtrees.
+"""
+import argparse
+import timeit
+import tracemalloc
+from pathlib import Path
+from bs4 import BeautifulSoup
+from utils import scraper
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+PAGES = {
+    "search": (FIXTURES / "search.html", scraper.SEARCH_PAGE_STRAINER,
+               lambda soup: scraper._extract_products(soup, "cleaning")),
+    "product": (FIXTURES / "product.html", scraper.PRODUCT_PAGE_STRAINER,
+                scraper._extract_store_entries),
+}
+
+
+def _variants():
+    variants = [("html.parser, full page (before)", "html.parser", False)]
+    if scraper.HTML_PARSER != "html.parser":
+        variants.append((f"{scraper.HTML_PARSER}, full page", scraper.HTML_PARSER, False))
+    variants.append(("html.parser + strainer", "html.parser", True))
+    if scraper.HTML_PARSER != "html.parser":
+        variants.append((f"{scraper.HTML_PARSER} + strainer (after)", scraper.HTML_PARSER, True))
+    return variants
+
+
+def _peak_kib(func) -> float:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="parses per variant and page")
+    args = parser.parse_args()
+
+    for page, (path, strainer, extract) in PAGES.items():
+        content = path.read_bytes()
+        print(f"\n{page} page ({len(content) / 1024:.0f} KiB)")
+        print(f"{'variant':<36}{'ms/page':>10}{'peak KiB':>12}{'speedup':>10}")
+
+        baseline, expected = None, None
+        for label, html_parser, restrict in _variants():
+            def run():
+                return extract(BeautifulSoup(content, html_parser, parse_only=strainer if restrict else None))
+
+            result = run()
+            if expected is None:
+                expected = result
+            elif result != expected:
+                raise SystemExit(f"{label} extracted different data from the {page} page")
+
+            seconds = min(timeit.repeat(run, number=1, repeat=args.repeat))
+            baseline = baseline or seconds
+            print(f"{label:<36}{seconds * 1000:>10.2f}{_peak_kib(run):>12.0f}{baseline / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
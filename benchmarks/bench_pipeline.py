@@ -0,0 +1,136 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of the discount pipeline against the local replay server.
+
+    python -m benchmarks.bench_pipeline --concurrency 1 4 16 --requests 32 --latency 0.08
+
+Each request runs what the price refresher and the dashboard do for the
+dashboard categories:
+    scrape   refresh_categories        (get_products_by_categories)
+    prices   refresh_store_prices      (get_store_prices, as in get_best_store_info)
+    deals    get_top_discounts         (price store → LLM → fallback), st.cache_data bypassed
+Everything runs offline: pages come from benchmarks/replay_server.py, the LLM
+call goes to its fake chat endpoint (unless --real-llm) and the price store is
+a throwaway SQLite file. The persistent LLM cache also lives in the workdir and
+is off unless --llm-cache is given, so runs time the pipeline, not cache hits.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from benchmarks import replay_server
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _configure(server, workdir: Path, real_llm: bool, llm_cache: bool):
+    """Points the scraper, HTTP and LLM caches, LLM client and database at local stand-ins. Must run before app imports."""
+    os.environ["TROLLEY_BASE_URL"] = server.base_url
+    os.environ["HTTP_CACHE_DIR"] = str(workdir / "http")
+    os.environ["LLM_CACHE_PATH"] = str(workdir / "llm.db")
+    if not llm_cache:
+        os.environ["LLM_CACHE_TTL"] = "0"  # nothing stored is ever fresh enough to be served
+    if not real_llm:
+        os.environ["OPENAI_API_KEY"] = "replay"
+        os.environ["OPENAI_BASE_URL"] = server.base_url + "/v1"
+
+    secrets = workdir / "secrets.toml"
+    secrets.write_text(f'DB_BACKEND = "sqlite"\nSQLITE_PATH = "{workdir / "bench.db"}"\n')
+    from streamlit import config
+    config.set_option("secrets.files", [str(secrets)])
+
+
+def run_level(pipeline, concurrency: int, requests: int) -> dict:
+    def one(_):
+        return pipeline()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    total = sorted(t["total"] for t in timings)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50": _percentile(total, 50),
+        "p90": _percentile(total, 90),
+        "p99": _percentile(total, 99),
+        "max": total[-1],
+        "stages": {
+            stage: _percentile(sorted(t[stage] for t in timings), 50)
+            for stage in ("scrape", "prices", "deals")
+        },
+        "empty": sum(1 for t in timings if not t["deals_found"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discount pipeline latency/throughput against the replay server.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=16, help="pipeline runs per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--real-llm", action="store_true", help="call the configured OpenAI endpoint instead")
+    parser.add_argument("--llm-cache", action="store_true", help="serve repeated prompts from the persistent LLM cache")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = replay_server.start(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        llm_latency=args.llm_latency, seed=args.seed
+    )
+    workdir = Path(tempfile.mkdtemp(prefix="scholarfi-bench-"))
+    _configure(server, workdir, args.real_llm, args.llm_cache)
+
+    from database.database import init_db
+    from services import discounts_service
+    from services.price_store import CATEGORY_TO_QUERY, refresh_categories, refresh_store_prices
+
+    init_db()
+    queries = tuple(sorted(set(CATEGORY_TO_QUERY.values())))
+
+    def pipeline() -> dict:
+        t0 = time.perf_counter()
+        categories = refresh_categories(queries)
+        t1 = time.perf_counter()
+        refresh_store_prices([p["href"] for products in categories.values() for p in products if p.get("href")])
+        t2 = time.perf_counter()
+        deals = discounts_service._get_top_discounts.__wrapped__(queries, None)
+        t3 = time.perf_counter()
+        return {"scrape": t1 - t0, "prices": t2 - t1, "deals": t3 - t2, "total": t3 - t0, "deals_found": bool(deals)}
+
+    print(f"Replay server {server.base_url}: latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, "
+          f"errors {args.error_rate:.0%}, slow {args.slow_rate:.0%}, LLM {args.llm_latency * 1000:.0f} ms, "
+          f"LLM cache {'on' if args.llm_cache else 'off'}")
+    print(f"{'conc':>5}{'reqs':>6}{'req/s':>8}{'p50 s':>8}{'p90 s':>8}{'p99 s':>8}{'max s':>8}"
+          f"{'scrape':>9}{'prices':>9}{'deals':>8}{'empty':>7}")
+    pipeline()  # warm-up: imports, connections, schema
+    for concurrency in args.concurrency:
+        r = run_level(pipeline, concurrency, args.requests)
+        s = r["stages"]
+        print(f"{r['concurrency']:>5}{r['requests']:>6}{r['throughput']:>8.2f}{r['p50']:>8.2f}{r['p90']:>8.2f}"
+              f"{r['p99']:>8.2f}{r['max']:>8.2f}{s['scrape']:>9.2f}{s['prices']:>9.2f}{s['deals']:>8.2f}{r['empty']:>7}")
+    print(f"Server counts: {server.counts}")
+    if args.llm_cache:
+        from utils import llm_cache
+        stats = llm_cache.cache_stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# benchmarks/replay_server.py
+"""
+Local stand-in for trolley.co.uk (and the OpenAI chat endpoint) that replays
+saved pages, so the scraper and the discount pipeline run offline.
+
+    python -m benchmarks.replay_server --port 8765 --latency 0.08 --error-rate 0.02
+    TROLLEY_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+    # Save real pages to replay later
+    python -m benchmarks.replay_server --record cleaning groceries
+
+Pages recorded with --record are served verbatim. Any other search or product
+URL falls back to the generic fixtures/search.html / product.html, with the
+product links made unique per query and the prices varied per product, so
+every category and product still looks different to the pipeline.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent / "fixtures"
+RECORDED = FIXTURES / "recorded"
+
+_PRODUCT_LINK = re.compile(r'href="/product/')
+_TABLE_PRICE = re.compile(r"£([0-9]+\.[0-9]+)")
+
+
+def _recorded_path(path: str) -> Path:
+    """Recorded page for a request path + query string."""
+    return RECORDED / (hashlib.sha256(path.encode()).hexdigest()[:24] + ".html")
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "all"
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    latency     seconds added to every response (± jitter, uniformly)
+    error_rate  fraction of page requests answered with 503
+    throttle_rate fraction answered with 429 + Retry-After: retry_after
+    slow_rate   fraction of page requests delayed by slow_latency instead
+    llm_latency seconds the fake chat completion takes
+    """
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, slow_rate=0.0,
+                 slow_latency=5.0, llm_latency=0.0, cache_control="no-store", seed=None,
+                 throttle_rate=0.0, retry_after=1):
+        super().__init__(address, ReplayHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.llm_latency = llm_latency
+        self.cache_control = cache_control
+        self.random = random.Random(seed)
+        self.search_page = (FIXTURES / "search.html").read_text()
+        self.product_page = (FIXTURES / "product.html").read_text()
+        self._lock = threading.Lock()
+        self.counts = {"search": 0, "product": 0, "llm": 0, "errors": 0, "throttled": 0, "slow": 0, "not_found": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, field):
+        with self._lock:
+            self.counts[field] += 1
+
+    def delay(self) -> float:
+        """Latency for the next page; also decides whether it fails. Returns -1 for a 503, -2 for a 429."""
+        with self._lock:
+            roll = self.random.random()
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if roll < self.error_rate:
+            self.count("errors")
+            return -1
+        roll -= self.error_rate
+        if roll < self.throttle_rate:
+            self.count("throttled")
+            return -2
+        roll -= self.throttle_rate
+        if roll < self.slow_rate:
+            self.count("slow")
+            return self.slow_latency
+        return max(0.0, delay)
+
+    def render_search(self, query: str) -> str:
+        return _PRODUCT_LINK.sub(f'href="/product/{_slug(query)}/', self.search_page)
+
+    def render_product(self, path: str) -> str:
+        # Same page for every product, with prices scaled by a per-product factor
+        factor = 0.6 + (zlib.crc32(path.encode()) % 80) / 100
+        return _TABLE_PRICE.sub(lambda m: f"£{float(m.group(1)) * factor:.2f}", self.product_page)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body: bytes, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", self.server.cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        # Health probes (see the scraper's circuit breaker)
+        status = 503 if self.server.delay() < 0 else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/":
+            return self._send(200, b"<html><body>Replay server</body></html>")
+        if url.path.startswith("/search"):
+            kind = "search"
+        elif url.path.startswith("/product/"):
+            kind = "product"
+        else:
+            self.server.count("not_found")
+            return self._send(404, b"Not found")
+
+        delay = self.server.delay()
+        if delay == -2:
+            self.send_response(429)
+            self.send_header("Retry-After", str(self.server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if delay < 0:
+            return self._send(503, b"Service unavailable")
+        time.sleep(delay)
+        self.server.count(kind)
+
+        recorded = _recorded_path(self.path)
+        if recorded.exists():
+            body = recorded.read_text()
+        elif kind == "search":
+            body = self.server.render_search(parse_qs(url.query).get("q", [""])[0])
+        else:
+            body = self.server.render_product(url.path)
+        self._send(200, body.encode())
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.server.count("not_found")
+            return self._send(404, b"Not found")
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.count("llm")
+        messages = request.get("messages", [])
+        content = json.dumps(_fake_selection(messages), indent=2)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4  # ~4 chars per token
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        }
+        if request.get("stream"):
+            return self._stream_completion(request, content, usage)
+        time.sleep(self.server.llm_latency)
+        self._send(200, json.dumps({
+            "id": "chatcmpl-replay",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "replay"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }).encode(), content_type="application/json")
+
+    def _stream_completion(self, request, content, usage):
+        """Server-sent events like the OpenAI API: the completion arrives a few characters at a time over llm_latency."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, **extra):
+            chunk = {"id": "chatcmpl-replay", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "replay"), "choices": choices, **extra}
+            self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            self.wfile.flush()
+
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+        time.sleep(self.server.llm_latency * 0.2)  # time to first token
+        step = self.server.llm_latency * 0.8 / max(1, len(pieces))
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for piece in pieces:
+            time.sleep(step)
+            event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def _fake_selection(messages: list) -> dict:
+    """Answers the deals prompt (id|category|title|store|price_gbp|drop_pct rows) with its three cheapest products."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    rows = []
+    for line in prompt.splitlines():
+        cells = line.split("|")
+        if len(cells) == 6 and re.fullmatch(r"p\d+", cells[0]):
+            try:
+                rows.append((float(cells[4]), cells[0]))
+            except ValueError:
+                continue
+    return {
+        "selected": [{"id": product_id, "justification": "Lowest price in the list."} for _, product_id in sorted(rows)[:3]],
+        "analysis": "Replay server selection.",
+        "confidence": 0.5,
+    }
+
+
+# ---------------- RECORDING ----------------
+def record(queries, base_url="https://www.trolley.co.uk", products_per_query=10):
+    """Saves the search page of each query and its product pages under fixtures/recorded/."""
+    from utils import scraper
+    from utils.http_client import get_session
+
+    session = get_session()
+    RECORDED.mkdir(parents=True, exist_ok=True)
+    for query in queries:
+        path = "/search/?from=search&q=" + query.replace(" ", "+")  # as the scraper builds it
+        response = session.get(base_url + path, headers=scraper.HEADERS, timeout=scraper.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        _recorded_path(path).write_bytes(response.content)
+
+        products = scraper._parse_search_page(response.content, query)[:products_per_query]
+        for product in products:
+            if not product["href"]:
+                continue
+            page = session.get(base_url + product["href"], headers=scraper.HEADERS, timeout=scraper.REQUEST_TIMEOUT)
+            if page.status_code == 200:
+                _recorded_path(product["href"]).write_bytes(page.content)
+        print(f"Recorded '{query}': search page + {len(products)} product pages")
+
+
+def start(port=0, **options) -> ReplayServer:
+    """Starts a server on a background thread (port 0 = any free port)."""
+    server = ReplayServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay saved trolley.co.uk pages locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="± seconds around --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of slow responses")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="seconds for a slow response")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per chat completion")
+    parser.add_argument("--cache-control", default="no-store", help="Cache-Control header to send")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", nargs="+", metavar="QUERY", help="record these queries from the real site and exit")
+    parser.add_argument("--record-from", default="https://www.trolley.co.uk")
+    args = parser.parse_args()
+
+    if args.record:
+        return record(args.record, args.record_from)
+
+    server = ReplayServer(
+        ("127.0.0.1", args.port),
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        llm_latency=args.llm_latency, cache_control=args.cache_control, seed=args.seed,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after
+    )
+    print(f"Replaying on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.counts)
+
+
+if __name__ == "__main__":
+    main()
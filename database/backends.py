@@ -0,0 +1,385 @@
+# database/backends.py
+import csv
+import functools
+import io
+import logging
+import queue
+import sqlite3
+import statistics
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+import psycopg2
+from psycopg2.extras import execute_values
+from database.pool import ConnectionPool
+from database.migrations import run_migrations
+
+class StorageBackend:
+    """
+    What db_methods needs from a database. SQL in db_methods is written once with
+    %s placeholders; backends supply connections that accept it and implement the
+    few operations whose SQL differs between engines.
+    """
+    name = None
+    Error = Exception           # base DB-API error of the driver
+    IntegrityError = Exception  # constraint violations (e.g. duplicate email)
+
+    def connection(self):
+        """Context manager: a connection that commits on success and rolls back on error."""
+        raise NotImplementedError
+
+    def migrate(self) -> int:
+        raise NotImplementedError
+
+    def month_start(self, column: str) -> str:
+        """SQL expression truncating a DATE column to the first day of its month."""
+        raise NotImplementedError
+
+    def median(self, column: str) -> str:
+        """SQL aggregate expression for the median of a numeric column."""
+        raise NotImplementedError
+
+    def decimal_sum(self, column: str) -> str:
+        """SQL aggregate expression summing a money column without rounding errors."""
+        raise NotImplementedError
+
+    def decimal_add(self, left: str, right: str) -> str:
+        """SQL expression adding two money values without rounding errors."""
+        raise NotImplementedError
+
+    def insert_many(self, cursor, sql: str, values: list):
+        """Runs an `INSERT ... VALUES %s ...` statement for many rows."""
+        raise NotImplementedError
+
+    def load_rows(self, cursor, table: str, columns: list, rows) -> None:
+        """Bulk-loads an iterator of tuples into `table` within the current transaction."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+# ---------------- POSTGRESQL ----------------
+class _CopyStream:
+    """Minimal file-like object that feeds COPY ... FROM STDIN from an iterator of CSV lines."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def _csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in rows:
+        writer.writerow(row)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+class PostgresBackend(StorageBackend):
+    """psycopg2 behind a process-wide ConnectionPool."""
+    name = "postgres"
+    Error = psycopg2.Error
+    IntegrityError = psycopg2.IntegrityError
+
+    def __init__(self, dsn: dict, minconn=1, maxconn=10, timeout=5.0, ping_after=30.0):
+        self.pool = ConnectionPool(
+            lambda: psycopg2.connect(**dsn),
+            minconn=minconn,
+            maxconn=maxconn,
+            timeout=timeout,
+            ping_after=ping_after
+        )
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken)
+
+    def migrate(self) -> int:
+        with self.connection() as conn:
+            return run_migrations(conn, self.name)
+
+    def month_start(self, column):
+        return f"date_trunc('month', {column})::date"
+
+    def median(self, column):
+        return f"percentile_cont(0.5) WITHIN GROUP (ORDER BY {column})"
+
+    def decimal_sum(self, column):
+        return f"SUM({column})"
+
+    def decimal_add(self, left, right):
+        return f"{left} + {right}"
+
+    def insert_many(self, cursor, sql, values):
+        execute_values(cursor, sql, values)
+
+    def load_rows(self, cursor, table, columns, rows):
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            _CopyStream(_csv_lines(rows))
+        )
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.closeall()
+
+
+# ---------------- SQLITE ----------------
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("NUMERIC", lambda b: Decimal(b.decode()))
+sqlite3.register_converter("DECIMAL_TEXT", lambda b: Decimal(b.decode()))
+
+
+@functools.lru_cache(maxsize=512)
+def _qmark(sql: str) -> str:
+    """Translates the pyformat placeholders used in db_methods to sqlite's qmark style."""
+    return sql.replace("%s", "?").replace("%%", "%")
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(_qmark(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_qmark(sql), seq_of_params)
+        return self
+
+    def __getattr__(self, name):
+        # fetchone, fetchall, rowcount, lastrowid, description, close...
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def _to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _decimal_add(left, right):
+    """decimal_add() for SQLite: money is stored as text, the result is text too."""
+    if left is None or right is None:
+        return None
+    return str(_to_decimal(left) + _to_decimal(right))
+
+
+class _DecimalSum:
+    """decimal_sum() aggregate for SQLite; SUM() would add the amounts as floats."""
+
+    def __init__(self):
+        self.total = None
+
+    def step(self, value):
+        if value is not None:
+            self.total = _to_decimal(value) + (self.total or 0)
+
+    def finalize(self):
+        return None if self.total is None else str(self.total)
+
+
+class _Median:
+    """median() aggregate for SQLite, which has none built in."""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return statistics.median(self.values) if self.values else None
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded single-file database in WAL mode: readers never block the writer
+    and there is no network hop. Connections are reused from a small free list;
+    each is used by one thread at a time.
+    """
+    name = "sqlite"
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._free = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "checkouts": 0, "in_use": 0}
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # transactions are opened explicitly in connection()
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.create_aggregate("median", 1, _Median)
+        conn.create_aggregate("decimal_sum", 1, _DecimalSum)
+        conn.create_function("decimal_add", 2, _decimal_add, deterministic=True)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self, begin="BEGIN"):
+        try:
+            conn = self._free.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        try:
+            # If BEGIN itself fails (e.g. "database is locked") there is nothing
+            # to roll back, and rolling back would hide the original error
+            conn.execute(begin)
+            try:
+                yield _SQLiteConnection(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._free.put(conn)
+
+    def migrate(self) -> int:
+        # IMMEDIATE takes the write lock up front, serialising concurrent migrators
+        with self.connection(begin="BEGIN IMMEDIATE") as conn:
+            return run_migrations(conn, self.name)
+
+    def month_start(self, column):
+        return f"date({column}, 'start of month')"
+
+    def median(self, column):
+        return f"median({column})"
+
+    def decimal_sum(self, column):
+        return f"decimal_sum({column})"
+
+    def decimal_add(self, left, right):
+        return f"decimal_add({left}, {right})"
+
+    def insert_many(self, cursor, sql, values):
+        if not values:
+            return
+        placeholders = "(" + ", ".join(["%s"] * len(values[0])) + ")"
+        cursor.executemany(sql.replace("VALUES %s", "VALUES " + placeholders, 1), values)
+
+    def load_rows(self, cursor, table, columns, rows):
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle"] = self._free.qsize()
+        return stats
+
+    def close(self):
+        while True:
+            try:
+                self._free.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def create_backend(config) -> StorageBackend:
+    """Builds the backend named by DB_BACKEND ("postgres" or "sqlite") from a secrets-like mapping."""
+    kind = str(config.get("DB_BACKEND", "postgres")).lower()
+    if kind == "sqlite":
+        logging.info("Using embedded SQLite storage backend.")
+        return SQLiteBackend(
+            config.get("SQLITE_PATH", "database/scholarfi.db"),
+            busy_timeout=float(config.get("SQLITE_BUSY_TIMEOUT", 5))
+        )
+    if kind in ("postgres", "postgresql"):
+        return PostgresBackend(
+            dsn={
+                "host": config["DB_HOST"],
+                "port": config["DB_PORT"],
+                "database": config["DB_NAME"],
+                "user": config["DB_USER"],
+                "password": config["DB_PASSWORD"],
+            },
+            minconn=int(config.get("DB_POOL_MIN", 1)),
+            maxconn=int(config.get("DB_POOL_MAX", 10)),
+            timeout=float(config.get("DB_POOL_TIMEOUT", 5)),
+            ping_after=float(config.get("DB_POOL_PING_AFTER", 30))
+        )
+    raise ValueError(f"Unknown DB_BACKEND '{kind}' (expected 'postgres' or 'sqlite')")
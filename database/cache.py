@@ -0,0 +1,115 @@
+# database/cache.py
+import functools
+import threading
+import streamlit as st
+from cachetools import LRUCache
+
+def _weight(value):
+    """Approximate cost of a cached result: one unit per row."""
+    if isinstance(value, tuple) and value and isinstance(value[0], list):
+        value = value[0]  # (rows, cursor) pages
+    if isinstance(value, (list, dict)):
+        return len(value) + 1
+    return 1
+
+
+class _CountingLRU(LRUCache):
+    def __init__(self, maxsize, getsizeof=None):
+        super().__init__(maxsize, getsizeof=getsizeof)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class ReadCache:
+    """
+    Process-wide LRU cache for db_methods reads, bounded by total row count.
+    Keys include a per-user data version and a global generation; writes bump
+    them so entries loaded before the write are never served again (they age
+    out of the LRU). Both only ever grow, so a read that finishes after a
+    write stores its result under a key nobody asks for any more.
+    """
+
+    def __init__(self, max_rows=50_000):
+        self._lock = threading.Lock()
+        self._entries = _CountingLRU(max_rows, getsizeof=_weight)
+        self._versions = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def version(self, user_id):
+        """(global generation, user version) to put in the cache key."""
+        with self._lock:
+            return self._generation, self._versions.get(user_id, 0)
+
+    def bump(self, user_id=None):
+        """Invalidates one user's cached reads, or everyone's when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                # Fresh LRU rather than clear(): clear() goes through popitem()
+                # and would count every entry as an eviction
+                evictions = self._entries.evictions
+                self._entries = _CountingLRU(self._entries.maxsize, getsizeof=_weight)
+                self._entries.evictions = evictions
+                self._generation += 1
+            else:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            try:
+                value = self._entries[key]
+                self._hits += 1
+                return value
+            except KeyError:
+                self._misses += 1
+        value = loader()
+        with self._lock:
+            try:
+                self._entries[key] = value
+            except ValueError:
+                pass  # single result bigger than the whole cache
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "rows": self._entries.currsize,
+                "max_rows": self._entries.maxsize,
+                "evictions": self._entries.evictions,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_read_cache():
+    """Shared by every session in the process. Size comes from DB_CACHE_MAX_ROWS."""
+    return ReadCache(max_rows=int(st.secrets.get("DB_CACHE_MAX_ROWS", 50_000)))
+
+
+def cached_read(func):
+    """
+    Read-through cache for db_methods functions whose first argument is user_id.
+    Returned objects are shared between sessions and must not be mutated.
+    """
+    @functools.wraps(func)
+    def wrapper(user_id, *args, **kwargs):
+        cache = get_read_cache()
+        key = (func.__name__, user_id, cache.version(user_id), args, tuple(sorted(kwargs.items())))
+        return cache.get_or_load(key, lambda: func(user_id, *args, **kwargs))
+    return wrapper
+
+
+def invalidate_user(user_id=None):
+    get_read_cache().bump(user_id)
+
+
+def read_cache_stats():
+    return get_read_cache().stats()
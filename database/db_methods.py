@@ -1,259 +1,325 @@
 # database/db_methods.py
-import psycopg2
-import bcrypt
-from database.database import get_connection
+from decimal import Decimal
+from database.database import get_backend, get_connection
+from database.cache import cached_read, invalidate_user
+
+
+def _decimal(value):
+    """Sums come back as Decimal from Postgres but as text from SQLite's decimal_sum()."""
+    if value is None or isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
 
-# ---------------- USERS ----------------
-def create_user(name, email, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-    hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
 
-    try:
+# ---------------- USERS ----------------
+# Passwords arrive already hashed (see services/auth_service.py).
+def create_user(name, email, password_hash):
+    """
+    Returns the new user id, or None if the email is already registered
+    (ON CONFLICT). Database errors propagate to the caller.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO users (name, email, password) VALUES (%s, %s, %s) RETURNING id",
-            (name, email, hashed_pw)
+            """
+            INSERT INTO users (name, email, password) VALUES (%s, %s, %s)
+            ON CONFLICT (email) DO NOTHING
+            RETURNING id
+            """,
+            (name, email, password_hash)
         )
-        user_id = cursor.fetchone()[0]
-        conn.commit()
-    except psycopg2.Error:
-        conn.close()
-        return None
+        row = cursor.fetchone()
 
-    conn.close()
-    return user_id
+    return row[0] if row else None
 
 
+@cached_read
 def get_user(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, password FROM users WHERE id=%s", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, email, password FROM users WHERE id=%s", (user_id,))
+        row = cursor.fetchone()
     if row:
         return {"id": row[0], "name": row[1], "email": row[2], "password": row[3]}
     return None
 
 
 def get_user_by_email(email):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, password FROM users WHERE email=%s", (email,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, email, password FROM users WHERE email=%s", (email,))
+        row = cursor.fetchone()
     return row
 
 
-def update_user_info(user_id, name=None, password=None):
-    conn = get_connection()
-    cursor = conn.cursor()
+def update_user_info(user_id, name=None, password_hash=None):
     updates = []
     values = []
 
     if name:
         updates.append("name=%s")
         values.append(name)
-    if password:
-        hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    if password_hash:
         updates.append("password=%s")
-        values.append(hashed_pw)
+        values.append(password_hash)
 
     if not updates:
-        conn.close()
         return False
 
     values.append(user_id)
-    cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id=%s", values)
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id=%s", values)
+    invalidate_user(user_id)
     return True
 
 
-def verify_user(email, password):
-    user = get_user_by_email(email)
-    if user:
-        hashed_pw = user[3]
-        if bcrypt.checkpw(password.encode(), hashed_pw.tobytes() if hasattr(hashed_pw, 'tobytes') else hashed_pw):
-            return {"id": user[0], "name": user[1], "email": user[2]}
-    return None
+# ---------------- MONTHLY SUMMARY ----------------
+def _add_to_monthly_summary(cursor, user_id, deltas):
+    """
+    Adds {(month, type, category): [amount, count]} to user_monthly_summary.
+    Must run in the same database transaction as the matching transaction inserts.
+    """
+    if not deltas:
+        return
+    # Fixed key order so concurrent writers lock rows in the same sequence
+    values = sorted(
+        (user_id, month, type_, category or "", amount, count)
+        for (month, type_, category), (amount, count) in deltas.items()
+    )
+    backend = get_backend()
+    amount = backend.decimal_add("user_monthly_summary.amount", "EXCLUDED.amount")
+    backend.insert_many(cursor, f"""
+        INSERT INTO user_monthly_summary (user_id, month, type, category, amount, tx_count)
+        VALUES %s
+        ON CONFLICT (user_id, month, type, category) DO UPDATE
+        SET amount = {amount},
+            tx_count = user_monthly_summary.tx_count + EXCLUDED.tx_count
+    """, values)
+
+
+def rebuild_monthly_summary(user_id=None):
+    """Recomputes user_monthly_summary from transactions, for one user or everyone."""
+    condition = "WHERE user_id=%s" if user_id is not None else ""
+    values = (user_id,) if user_id is not None else ()
+    month = get_backend().month_start("date")
+    amount = get_backend().decimal_sum("amount")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM user_monthly_summary {condition}", values)
+        cursor.execute(f"""
+            INSERT INTO user_monthly_summary (user_id, month, type, category, amount, tx_count)
+            SELECT user_id, {month}, type, COALESCE(category, ''), {amount}, COUNT(*)
+            FROM transactions
+            {condition}
+            GROUP BY 1, 2, 3, 4
+        """, values)
+        rows = cursor.rowcount
+    invalidate_user(user_id)
+    return rows
 
 
 # ---------------- TRANSACTIONS ----------------
 def add_transaction(user_id, amount, category, note, date, type_):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO transactions (user_id, amount, category, note, date, type)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (user_id, amount, category, note, date, type_))
-    conn.commit()
-    conn.close()
-
-
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO transactions (user_id, amount, category, note, date, type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (user_id, amount, category, note, date, type_))
+        _add_to_monthly_summary(cursor, user_id, {(date.replace(day=1), type_, category): (amount, 1)})
+    invalidate_user(user_id)
+
+
+def bulk_add_transactions(user_id, rows):
+    """
+    Loads an iterable of transactions (dicts with amount, category, note, date, type)
+    in one database transaction (COPY on Postgres) and updates the monthly summary
+    in the same transaction. Rows are streamed, never held in memory all at once.
+    Returns the number of rows inserted.
+    """
+    count = 0
+    deltas = {}
+
+    def values():
+        nonlocal count
+        for row in rows:
+            key = (row["date"].replace(day=1), row["type"], row.get("category"))
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += row["amount"]
+            delta[1] += 1
+            count += 1
+            yield (user_id, row["amount"], row.get("category"), row.get("note") or "", row["date"], row["type"])
+
+    backend = get_backend()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        backend.load_rows(cursor, "transactions", ["user_id", "amount", "category", "note", "date", "type"], values())
+        _add_to_monthly_summary(cursor, user_id, deltas)
+    invalidate_user(user_id)
+    return count
+
+
+@cached_read
 def get_transactions(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, amount, category, note, date, type
-        FROM transactions
-        WHERE user_id=%s
-        ORDER BY date DESC
-    """, (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, amount, category, note, date, type
+            FROM transactions
+            WHERE user_id=%s
+            ORDER BY date DESC
+        """, (user_id,))
+        rows = cursor.fetchall()
     return [
         {"id": r[0], "amount": r[1], "category": r[2], "note": r[3], "date": r[4], "type": r[5]}
         for r in rows
     ]
 
 
+@cached_read
+def get_transactions_page(user_id, limit=20, after=None, type_=None, category=None,
+                          start_date=None, end_date=None):
+    """
+    One page of transactions, newest first, using keyset pagination on (date, id).
+    Optional filters: type, category and a [start_date, end_date) range.
+    Returns (transactions, next_cursor); pass next_cursor as `after` to get the
+    following page. next_cursor is None on the last page.
+    """
+    conditions = ["user_id=%s"]
+    values = [user_id]
+    if type_:
+        conditions.append("type=%s")
+        values.append(type_)
+    if category:
+        conditions.append("category=%s")
+        values.append(category)
+    if start_date:
+        conditions.append("date >= %s")
+        values.append(start_date)
+    if end_date:
+        conditions.append("date < %s")
+        values.append(end_date)
+    if after:
+        conditions.append("(date, id) < (%s, %s)")
+        values.extend(after)
+    # One extra row tells us whether there is a next page
+    values.append(limit + 1)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, amount, category, note, date, type
+            FROM transactions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY date DESC, id DESC
+            LIMIT %s
+        """, values)
+        rows = cursor.fetchall()
+
+    next_cursor = (rows[limit - 1][4], rows[limit - 1][0]) if len(rows) > limit else None
+    return [
+        {"id": r[0], "amount": r[1], "category": r[2], "note": r[3], "date": r[4], "type": r[5]}
+        for r in rows[:limit]
+    ], next_cursor
+
+
+# ---------------- AGGREGATES ----------------
+# Read from user_monthly_summary: O(months) rows instead of O(transactions).
+@cached_read
+def get_totals_by_type(user_id):
+    """Total amount per transaction type, e.g. {"income": Decimal, "expense": Decimal}."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT type, {get_backend().decimal_sum("amount")}
+            FROM user_monthly_summary
+            WHERE user_id=%s
+            GROUP BY type
+        """, (user_id,))
+        rows = cursor.fetchall()
+    return {r[0]: _decimal(r[1]) for r in rows}
+
+
+@cached_read
+def get_monthly_totals(user_id):
+    """Total amount per (month, type), oldest month first. `month` is the first day of the month."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT month, type, {get_backend().decimal_sum("amount")}
+            FROM user_monthly_summary
+            WHERE user_id=%s
+            GROUP BY month, type
+            ORDER BY month
+        """, (user_id,))
+        rows = cursor.fetchall()
+    return [{"month": r[0], "type": r[1], "amount": _decimal(r[2])} for r in rows]
+
+
+@cached_read
+def get_category_totals(user_id, type_="expense", start_month=None, end_month=None):
+    """
+    Total amount per category for one transaction type, largest first.
+    Optional month range is [start_month, end_month), both given as the first day of a month.
+    """
+    conditions = ["user_id=%s", "type=%s"]
+    values = [user_id, type_]
+    if start_month:
+        conditions.append("month >= %s")
+        values.append(start_month)
+    if end_month:
+        conditions.append("month < %s")
+        values.append(end_month)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT category, {get_backend().decimal_sum("amount")}
+            FROM user_monthly_summary
+            WHERE {' AND '.join(conditions)}
+            GROUP BY category
+        """, values)
+        rows = cursor.fetchall()
+    # Sorted here: SQLite's exact sums are text and would sort as strings
+    totals = [{"category": r[0] or None, "amount": _decimal(r[1])} for r in rows]
+    return sorted(totals, key=lambda t: t["amount"], reverse=True)
+
+
 # ---------------- GOALS ----------------
 def create_goal(user_id, name, target_amount, deadline):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO goals (user_id, name, target_amount, deadline)
-        VALUES (%s, %s, %s, %s)
-    """, (user_id, name, target_amount, deadline))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO goals (user_id, name, target_amount, deadline)
+            VALUES (%s, %s, %s, %s)
+        """, (user_id, name, target_amount, deadline))
+    invalidate_user(user_id)
 
 
 def add_to_goal(goal_id, amount, date_):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE goals SET current_amount = current_amount + %s WHERE id=%s",
-        (amount, goal_id)
-    )
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        current = get_backend().decimal_add("current_amount", "%s")
+        cursor.execute(
+            f"UPDATE goals SET current_amount = {current} WHERE id=%s RETURNING user_id",
+            (amount, goal_id)
+        )
+        row = cursor.fetchone()
+    if row:
+        invalidate_user(row[0])
 
 
+@cached_read
 def get_goals(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, name, target_amount, current_amount, deadline FROM goals WHERE user_id=%s",
-        (user_id,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, name, target_amount, current_amount, deadline FROM goals WHERE user_id=%s",
+            (user_id,)
+        )
+        rows = cursor.fetchall()
     return [
         {"id": r[0], "name": r[1], "target_amount": r[2], "current_amount": r[3], "deadline": r[4]}
         for r in rows
     ]
-
-
-# import sqlite3
-# import bcrypt
-# from database.database import get_connection
-
-# # ---------------- USERS ----------------
-# def create_user(name, email, password):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-#     try:
-#         cursor.execute("INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
-#                        (name, email, hashed_pw))
-#         conn.commit()
-#         user_id = cursor.lastrowid
-#     except sqlite3.IntegrityError:
-#         conn.close()
-#         return None  # email ya existe
-#     conn.close()
-#     return user_id
-
-# def get_user(user_id):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("SELECT * FROM users WHERE id=?", (user_id,))
-#     row = cursor.fetchone()
-#     conn.close()
-#     if row:
-#         return {"id": row[0], "name": row[1], "email": row[2], "password": row[3]}
-#     return None
-
-# def get_user_by_email(email):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-#     row = cursor.fetchone()
-#     conn.close()
-#     return row
-
-# def update_user_info(user_id, name=None, password=None):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     updates = []
-#     values = []
-
-#     if name:
-#         updates.append("name=?")
-#         values.append(name)
-#     if password:
-#         hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-#         updates.append("password=?")
-#         values.append(hashed_pw)
-
-#     if not updates:
-#         conn.close()
-#         return False
-
-#     values.append(user_id)
-#     cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id=?", values)
-#     conn.commit()
-#     conn.close()
-#     return True
-
-# def verify_user(email, password):
-#     user = get_user_by_email(email)
-#     if user:
-#         hashed_pw = user[3]
-#         if isinstance(hashed_pw, str):
-#             hashed_pw = hashed_pw.encode("utf-8")
-#         if bcrypt.checkpw(password.encode(), hashed_pw):
-#             return {"id": user[0], "name": user[1], "email": user[2]}
-#     return None
-
-# # ---------------- TRANSACTIONS ----------------
-# def add_transaction(user_id, amount, category, note, date, type_):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("INSERT INTO transactions (user_id, amount, category, note, date, type) VALUES (?, ?, ?, ?, ?, ?)",
-#                    (user_id, amount, category, note, date, type_))
-#     conn.commit()
-#     conn.close()
-
-# def get_transactions(user_id):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("SELECT id, amount, category, note, date, type FROM transactions WHERE user_id=? ORDER BY date DESC", (user_id,))
-#     rows = cursor.fetchall()
-#     conn.close()
-#     return [{"id": r[0], "amount": r[1], "category": r[2], "note": r[3], "date": r[4], "type": r[5]} for r in rows]
-
-# # ---------------- GOALS ----------------
-# def create_goal(user_id, name, target_amount, deadline):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("INSERT INTO goals (user_id, name, target_amount, deadline) VALUES (?, ?, ?, ?)",
-#                    (user_id, name, target_amount, deadline))
-#     conn.commit()
-#     conn.close()
-
-# def add_to_goal(goal_id, amount, date_):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("UPDATE goals SET current_amount = current_amount + ? WHERE id=?", (amount, goal_id))
-#     conn.commit()
-#     conn.close()
-
-# def get_goals(user_id):
-#     conn = get_connection()
-#     cursor = conn.cursor()
-#     cursor.execute("SELECT id, name, target_amount, current_amount, deadline FROM goals WHERE user_id=?", (user_id,))
-#     rows = cursor.fetchall()
-#     conn.close()
-#     return [{"id": r[0], "name": r[1], "target_amount": r[2], "current_amount": r[3], "deadline": r[4]} for r in rows]
@@ -0,0 +1,291 @@
+# database/migrations.py
+import logging
+
+# Arbitrary key for pg_advisory_xact_lock so only one process migrates at a time
+MIGRATION_LOCK_ID = 724_311
+
+_USER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date, id);",
+    "CREATE INDEX IF NOT EXISTS idx_goals_user ON goals (user_id);",
+]
+
+_SCRAPE_STORE = [
+    """
+    CREATE TABLE IF NOT EXISTS scraped_categories (
+        query VARCHAR(255) PRIMARY KEY,
+        products TEXT NOT NULL,
+        fetched_at DOUBLE PRECISION NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scraped_products (
+        href TEXT PRIMARY KEY,
+        stores TEXT NOT NULL,
+        fetched_at DOUBLE PRECISION NOT NULL
+    );
+    """,
+]
+
+# One row per (product, store) price seen by the scraper; prices and times
+# are floats like the scrape store. Looked up by product over a time window.
+_PRICE_HISTORY = [
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+        href TEXT NOT NULL,
+        store VARCHAR(255) NOT NULL,
+        price DOUBLE PRECISION NOT NULL,
+        observed_at DOUBLE PRECISION NOT NULL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_price_history_href_time ON price_history (href, observed_at);",
+]
+
+# Best price per product and UTC day (day = observed_at // 86400), plus the
+# best price of the latest scrape: drops are computed over <= window-days rows.
+_PRICE_DAILY_TABLE = """
+    CREATE TABLE IF NOT EXISTS price_daily (
+        href TEXT NOT NULL,
+        day INTEGER NOT NULL,
+        best_price DOUBLE PRECISION NOT NULL,
+        last_price DOUBLE PRECISION NOT NULL,
+        last_at DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (href, day)
+    );
+"""
+
+# Backfill from the raw history; last_price of past days is their best price
+_PRICE_DAILY_BACKFILL = """
+    INSERT INTO price_daily (href, day, best_price, last_price, last_at)
+    SELECT href, day, MIN(price), MIN(price), MAX(observed_at)
+    FROM (SELECT href, {day} AS day, price, observed_at FROM price_history) h
+    GROUP BY href, day;
+"""
+
+# SQLite gives NUMERIC columns REAL affinity, so money summed in the rollup
+# drifted (10.00 + 2.80 = 12.799999999999999). Money is rebuilt as text
+# (DECIMAL_TEXT, read back as Decimal) and summed with decimal_sum/decimal_add,
+# which the SQLite backend registers on every connection.
+_SQLITE_DECIMAL_MONEY = [
+    """
+    CREATE TABLE transactions_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        amount DECIMAL_TEXT NOT NULL,
+        category TEXT,
+        note TEXT,
+        date DATE NOT NULL,
+        type TEXT NOT NULL
+    );
+    """,
+    """
+    INSERT INTO transactions_new (id, user_id, amount, category, note, date, type)
+    SELECT id, user_id, CAST(amount AS TEXT), category, note, date, type FROM transactions;
+    """,
+    "DROP TABLE transactions;",
+    "ALTER TABLE transactions_new RENAME TO transactions;",
+    _USER_INDEXES[0],
+    """
+    CREATE TABLE goals_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        target_amount DECIMAL_TEXT NOT NULL,
+        current_amount DECIMAL_TEXT DEFAULT '0',
+        deadline DATE
+    );
+    """,
+    """
+    INSERT INTO goals_new (id, user_id, name, target_amount, current_amount, deadline)
+    SELECT id, user_id, name, CAST(target_amount AS TEXT), CAST(current_amount AS TEXT), deadline FROM goals;
+    """,
+    "DROP TABLE goals;",
+    "ALTER TABLE goals_new RENAME TO goals;",
+    _USER_INDEXES[1],
+    """
+    CREATE TABLE user_monthly_summary_new (
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        month DATE NOT NULL,
+        type TEXT NOT NULL,
+        category TEXT NOT NULL DEFAULT '',
+        amount DECIMAL_TEXT NOT NULL DEFAULT '0',
+        tx_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, month, type, category)
+    );
+    """,
+    # Recomputed rather than copied: the old totals may already have drifted
+    """
+    INSERT INTO user_monthly_summary_new (user_id, month, type, category, amount, tx_count)
+    SELECT user_id, date(date, 'start of month'), type, COALESCE(category, ''), decimal_sum(amount), COUNT(*)
+    FROM transactions
+    GROUP BY 1, 2, 3, 4;
+    """,
+    "DROP TABLE user_monthly_summary;",
+    "ALTER TABLE user_monthly_summary_new RENAME TO user_monthly_summary;",
+]
+
+# (version, description, {dialect: statements}).
+# Append new entries, never edit applied ones.
+MIGRATIONS = [
+    (1, "initial schema", {
+        "postgres": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password BYTEA NOT NULL
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                amount NUMERIC NOT NULL,
+                category VARCHAR(255),
+                note TEXT,
+                date DATE NOT NULL,
+                type VARCHAR(50) NOT NULL
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS goals (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                name VARCHAR(255) NOT NULL,
+                target_amount NUMERIC NOT NULL,
+                current_amount NUMERIC DEFAULT 0,
+                deadline DATE
+            );
+            """,
+        ],
+        # DATE / NUMERIC declared types map to date / Decimal converters (see backends.py)
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password BLOB NOT NULL
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                amount NUMERIC NOT NULL,
+                category TEXT,
+                note TEXT,
+                date DATE NOT NULL,
+                type TEXT NOT NULL
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS goals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                name TEXT NOT NULL,
+                target_amount NUMERIC NOT NULL,
+                current_amount NUMERIC DEFAULT 0,
+                deadline DATE
+            );
+            """,
+        ],
+    }),
+    (2, "per-user lookup indexes", {
+        "postgres": _USER_INDEXES,
+        "sqlite": _USER_INDEXES,
+    }),
+    (3, "per-user monthly rollup", {
+        "postgres": [
+            """
+            CREATE TABLE IF NOT EXISTS user_monthly_summary (
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                month DATE NOT NULL,
+                type VARCHAR(50) NOT NULL,
+                category VARCHAR(255) NOT NULL DEFAULT '',
+                amount NUMERIC NOT NULL DEFAULT 0,
+                tx_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, month, type, category)
+            );
+            """,
+            """
+            INSERT INTO user_monthly_summary (user_id, month, type, category, amount, tx_count)
+            SELECT user_id, date_trunc('month', date)::date, type, COALESCE(category, ''), SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT DO NOTHING;
+            """,
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS user_monthly_summary (
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                month DATE NOT NULL,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL DEFAULT '',
+                amount NUMERIC NOT NULL DEFAULT 0,
+                tx_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, month, type, category)
+            );
+            """,
+            """
+            INSERT OR IGNORE INTO user_monthly_summary (user_id, month, type, category, amount, tx_count)
+            SELECT user_id, date(date, 'start of month'), type, COALESCE(category, ''), SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY 1, 2, 3, 4;
+            """,
+        ],
+    }),
+    (4, "shared scraped product/price store", {
+        "postgres": _SCRAPE_STORE,
+        "sqlite": _SCRAPE_STORE,
+    }),
+    (5, "price history", {
+        "postgres": _PRICE_HISTORY,
+        "sqlite": _PRICE_HISTORY,
+    }),
+    (6, "daily price rollup", {
+        "postgres": [_PRICE_DAILY_TABLE, _PRICE_DAILY_BACKFILL.format(day="FLOOR(observed_at / 86400)::integer")],
+        "sqlite": [_PRICE_DAILY_TABLE, _PRICE_DAILY_BACKFILL.format(day="CAST(observed_at / 86400 AS INTEGER)")],
+    }),
+    (7, "exact money columns on sqlite", {
+        "postgres": [],
+        "sqlite": _SQLITE_DECIMAL_MONEY,
+    }),
+]
+
+
+def run_migrations(conn, dialect="postgres") -> int:
+    """
+    Applies every migration newer than the recorded schema version inside the
+    caller's transaction. Returns the resulting schema version.
+    On SQLite the caller must hold a write lock (BEGIN IMMEDIATE) instead of
+    the advisory lock taken here for Postgres.
+    """
+    cursor = conn.cursor()
+    if dialect == "postgres":
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cursor.fetchone()[0]
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements[dialect]:
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        logging.info(f"Applied migration {version} ({dialect}): {description}")
+        current = version
+
+    cursor.close()
+    return current
@@ -0,0 +1,167 @@
+# database/pool.py
+import logging
+import threading
+import time
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+class PoolTimeout(Exception):
+    """Raised when no connection is available before the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    - Opens `minconn` connections up front and never more than `maxconn`.
+    - getconn() blocks up to `timeout` seconds when every connection is busy.
+    - Connections idle for more than `ping_after` seconds are checked with
+      SELECT 1 before being handed out; dead ones are replaced transparently.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=5.0, ping_after=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn must be <= maxconn and maxconn >= 1")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, last_used)
+        self._size = 0   # open connections, idle + in use
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+        }
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+            self._stats["created"] += 1
+
+    # ---------------- CHECKOUT ----------------
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Reserve the slot now, open the connection outside the lock
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"({self._size}/{self.maxconn} in use)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.monotonic() - start
+
+        if conn is not None and self._is_alive(conn, last_used):
+            return conn
+
+        if conn is not None:
+            logging.warning("Discarding dead database connection from pool.")
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats["discarded"] += 1
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        if close or conn.closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    # ---------------- STATS ----------------
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+            stats["max"] = self.maxconn
+        stats["avg_wait_time"] = stats["wait_time"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    # ---------------- HELPERS ----------------
+    def _is_alive(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
@@ -0,0 +1,20 @@
+# database/rebuild_summary.py
+# Backfill / repair user_monthly_summary from the transactions table.
+#   python -m database.rebuild_summary            -> every user
+#   python -m database.rebuild_summary --user 42  -> a single user
+import argparse
+import logging
+from database.database import init_db
+from database.db_methods import rebuild_monthly_summary
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-user monthly summary table.")
+    parser.add_argument("--user", type=int, default=None, help="Only rebuild this user id")
+    args = parser.parse_args()
+
+    init_db()
+    rows = rebuild_monthly_summary(args.user)
+    target = f"user {args.user}" if args.user is not None else "all users"
+    logging.info(f"Rebuilt monthly summary for {target}: {rows} rows.")
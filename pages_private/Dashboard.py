@@ -4,8 +4,11 @@ import altair as alt
 from pathlib import Path
 from utils.auth import require_login
 from utils.styles import load_css
-from services.discounts_service import get_top_discounts
-from database.db_methods import get_transactions, get_goals
+from services.discounts_service import get_top_discounts, stream_top_discounts
+from services.price_store import CATEGORY_TO_QUERY
+from services.deal_ranker import spend_weights
+from database.db_methods import (get_transactions_page, get_goals, get_totals_by_type,
+    get_monthly_totals, get_category_totals)
 from pages_private.AI_Coach import run as coach_run
 from services.savings_recomender import generate_savings_recommendations
 
@@ -19,12 +22,13 @@ def run():
     load_css()
 
     # --- Fetch Data ---
-    transactions = get_transactions(user_id)
+    totals = get_totals_by_type(user_id)
+    expense_categories = get_category_totals(user_id)
     goals = get_goals(user_id)
 
     # --- Financial Metrics ---
-    total_income = sum(t['amount'] for t in transactions if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in transactions if t['type'] == 'expense')
+    total_income = totals.get('income', 0)
+    total_expense = totals.get('expense', 0)
     total_balance = total_income - total_expense
     total_savings = sum(g['current_amount'] for g in goals)
 
@@ -61,32 +65,21 @@ def run():
    # --- Money Flow Chart ---
     with col1:
         st.markdown("<div class='section-card'><h3>Money Flow</h3>", unsafe_allow_html=True)
-        df = pd.DataFrame(transactions)
+        # Already aggregated by (month, type) in the database
+        df = pd.DataFrame(get_monthly_totals(user_id))
         if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-            # Pivot table por tipo
-            df_long = df.pivot_table(
-                index=df['date'].dt.month,  # Usamos número de mes para ordenar
-                columns='type',
-                values='amount',
-                aggfunc='sum'
-            ).fillna(0).reset_index()
-            # Solo columnas existentes
-            columns_to_melt = [col for col in ['income', 'expense'] if col in df_long.columns]
-            if columns_to_melt:
-                df_long = df_long.melt(
-                    id_vars='date',  # aquí 'date' es el número de mes
-                    value_vars=columns_to_melt,
-                    var_name='Type',
-                    value_name='Amount'
-                )
-                # Mapeamos número de mes a nombre de mes para mostrar
-                month_names = {1:'Jan', 2:'Feb', 3:'Mar', 4:'Apr', 5:'May', 6:'Jun',
-                            7:'Jul', 8:'Aug', 9:'Sep', 10:'Oct', 11:'Nov', 12:'Dec'}
-                df_long['Month'] = df_long['date'].map(month_names)
+            df_long = df[df['type'].isin(['income', 'expense'])]
+            if not df_long.empty:
+                df_long = pd.DataFrame({
+                    'Month': pd.to_datetime(df_long['month']).dt.strftime('%b %Y'),
+                    'Type': df_long['type'],
+                    'Amount': df_long['amount'].astype(float)
+                })
+                # Rows come ordered by month, keep that order on the axis
+                month_order = list(dict.fromkeys(df_long['Month']))
                 # --- Chart ---
                 chart = alt.Chart(df_long).mark_bar().encode(
-                    x=alt.X("Month:N", sort=list(month_names.values())),  # orden correcto
+                    x=alt.X("Month:N", sort=month_order),
                     y="Amount:Q",
                     color=alt.Color("Type:N", scale=alt.Scale(range=["#dd6548", "#faf0ee"])),
                     tooltip=["Month", "Type", "Amount"]
@@ -101,33 +94,38 @@ def run():
     # --- Store Discounts ---
     with col2:
         st.markdown("<div class='section-card'><h3>Discounts</h3>", unsafe_allow_html=True)
-        has_expenses = any(t['type'] == 'expense' for t in transactions)
+        has_expenses = bool(expense_categories)
         if not has_expenses:
             st.info("No expenses yet.")
         else:
             try:
-                category_to_query = {
-                    "Groceries": "groceries",
-                    "Health & Beauty": "health+beauty",
-                    "Cleaning": "cleaning",
-                    "Online Shopping": "online+shopping",
-                    "Others": "other"
-                }
-                user_categories = set(t['category'] for t in transactions if t['type'] == 'expense' and t['category'] in category_to_query)
-                queries = [category_to_query[cat] for cat in user_categories] if user_categories else ["groceries"]
+                user_categories = set(c['category'] for c in expense_categories if c['category'] in CATEGORY_TO_QUERY)
+                queries = [CATEGORY_TO_QUERY[cat] for cat in user_categories] if user_categories else ["groceries"]
                 user_context = {}
+                # Spend share per category, to rank deals where the user spends most
+                category_weights = spend_weights(expense_categories, CATEGORY_TO_QUERY)
                 
                 # Add snippet while loading discounts
                 loading_msg = st.empty()
                 loading_msg.markdown('<div style="color: #d71f59; font-size: 1em; font-weight: bold;">🔍 ScholarFi is analyzing the best offers according to your spends...</div>', unsafe_allow_html=True)
-                discounts = get_top_discounts(queries, user_context)
-                loading_msg.empty() 
-                
-                if not discounts:
-                    st.markdown("<div class='alert-warning'>No discounts available right now.</div>", unsafe_allow_html=True)
+                if st.secrets.get("DISCOUNTS_STREAMING", True):
+                    # Each deal is shown as soon as the model has written it
+                    discounts = stream_top_discounts(queries, user_context, category_weights)
                 else:
-                    for d in discounts[:5]:
-                        st.markdown(f"<div class='alert-warning'>{d.get('text', '')}</div>", unsafe_allow_html=True)
+                    discounts = get_top_discounts(queries, user_context, category_weights)
+
+                shown = 0
+                for d in discounts:
+                    if shown == 0:
+                        loading_msg.empty()
+                    st.markdown(f"<div class='alert-warning'>{d.get('text', '')}</div>", unsafe_allow_html=True)
+                    shown += 1
+                    if shown == 5:
+                        break
+                loading_msg.empty()
+
+                if not shown:
+                    st.markdown("<div class='alert-warning'>No discounts available right now.</div>", unsafe_allow_html=True)
             except Exception as e:
                 st.error(f"Error loading discounts: {str(e)}")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -137,14 +135,14 @@ def run():
 
     with col1:
         st.markdown("<div class='section-card'><h3>Recent Transactions</h3>", unsafe_allow_html=True)
+        transactions, _ = get_transactions_page(user_id, limit=5)
         if transactions:
             # Convert to DataFrame
             df_trans = pd.DataFrame(transactions)
             df_trans = df_trans[['amount', 'category', 'date', 'type']]
             # Ensure 'amount' is numeric and round to 2 decimals
             df_trans['amount'] = df_trans['amount'].astype(float).round(2)
-            # Last 5 transactions sorted by date
-            df_trans = df_trans.sort_values(by='date', ascending=False).head(5)
+            # Already the last 5 transactions, newest first
             
             # Function to color 'amount' based on 'type' (returns a Series with styles for each column)
             def color_amount(row):
@@ -165,19 +163,18 @@ def run():
     with col2:
         current_month_name = pd.Timestamp.now().strftime("%B")
         st.markdown(f"<div class='section-card'><h3>Expense Breakdown {current_month_name}</h3>", unsafe_allow_html=True)
-        df = pd.DataFrame(transactions)
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date']) # Date conversion
-            df = df[df['type'] == 'expense'] # Filter only expenses
-            # Filter actual month
-            current_month = pd.Timestamp.now().month
-            current_year = pd.Timestamp.now().year
-            df = df[(df['date'].dt.month == current_month) & (df['date'].dt.year == current_year)]
-
-            if df.empty:
+        if totals:
+            # Expenses of the current month, grouped by category in the database
+            month_start = pd.Timestamp.now().normalize().replace(day=1)
+            next_month = month_start + pd.DateOffset(months=1)
+            df_grouped = pd.DataFrame(get_category_totals(
+                user_id, start_month=month_start.date(), end_month=next_month.date()
+            ))
+
+            if df_grouped.empty:
                 st.info("No expenses recorded this month.")
             else:
-                df_grouped = df.groupby("category")["amount"].sum().reset_index() # Grouped by category
+                df_grouped['amount'] = df_grouped['amount'].astype(float)
                 # Create the Pie Chart
                 pie = alt.Chart(df_grouped).mark_arc().encode(
                     theta=alt.Theta("amount:Q", title="Amount"),
@@ -212,7 +209,7 @@ def run():
     
     with col1:
         st.markdown("<div class='section-card'><h3>Personalized Savings Tips</h3>", unsafe_allow_html=True)
-        recommendations = generate_savings_recommendations(transactions, goals)
+        recommendations = generate_savings_recommendations(expense_categories, goals, has_transactions=bool(totals))
         for r in recommendations:
             st.markdown(f"<div class='alert-warning'>{r['text']}</div>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
@@ -1,11 +1,23 @@
 import streamlit as st
-from datetime import date
+import pandas as pd
+from datetime import date, timedelta
 from pathlib import Path
 from utils.auth import require_login
 from utils.styles import load_css
-from database.db_methods import ( get_user, update_user_info, 
-    add_transaction, create_goal, add_to_goal, get_goals)
+from database.db_methods import ( get_user,
+    add_transaction, get_transactions_page, create_goal, add_to_goal, get_goals)
 from pages_public.Register import is_strong_password
+from services.statement_import import import_statement
+from services.auth_service import update_profile
+
+EXPENSE_CATEGORIES = ["Groceries", "Health & Beauty", "Cleaning", "Online Shopping", "Others"]
+
+def _next_history_page(cursor):
+    st.session_state.hist_cursors.append(cursor)
+
+def _prev_history_page():
+    if len(st.session_state.hist_cursors) > 1:
+        st.session_state.hist_cursors.pop()
 
 def run():
     # --- SESSION AUTH CHECK ---
@@ -34,7 +46,7 @@ def run():
         elif not is_strong_password(new_password):
             st.warning("Password must be at least 8 characters long and include at least 1 letter, 1 number, and 1 special character.")
         else:
-            success = update_user_info(user_id, name=name, password=new_password)
+            success = update_profile(user_id, name=name, password=new_password)
             if success:
                 st.success("Personal information updated successfully!")
             else:
@@ -57,7 +69,7 @@ def run():
         trans_date = st.date_input("Date", value=date.today(), key=date_key, max_value=date.today())
 
         if not is_income:
-            category = st.selectbox("Category", ["Groceries", "Health & Beauty", "Cleaning", "Online Shopping", "Others"], key=category_key)
+            category = st.selectbox("Category", EXPENSE_CATEGORIES, key=category_key)
             note = st.text_input("Note (optional)", key=note_key)
         else:
             category, note = "Deposit", ""
@@ -77,6 +89,63 @@ def run():
         st.markdown("**Spend / Withdraw Money**")
         handle_transaction(is_income=False)
 
+    # --- IMPORT BANK STATEMENT ---
+    st.markdown("<div class='section-card'><h3>🏦 Import Bank Statement</h3></div>", unsafe_allow_html=True)
+    statement = st.file_uploader("Upload a CSV or OFX statement", type=["csv", "ofx", "qfx"], key="statement_file")
+    if statement is not None and st.button("Import Transactions", key="btn_import"):
+        with st.spinner("Importing transactions..."):
+            result = import_statement(user_id, statement, statement.name)
+        if result["imported"]:
+            st.success(
+                f"Imported {result['imported']} transactions in {result['seconds']:.2f}s "
+                f"({result['rows_per_second']:,.0f} rows/s)."
+            )
+        else:
+            st.warning("No valid transactions found in this file.")
+        if result["errors"]:
+            with st.expander(f"{result['rejected']} rows skipped"):
+                for number, error in result["errors"][:50]:
+                    st.write(f"- Row {number}: {error}")
+
+    # --- TRANSACTION HISTORY ---
+    st.markdown("<div class='section-card'><h3>📜 Transaction History</h3></div>", unsafe_allow_html=True)
+    f1, f2, f3, f4 = st.columns(4)
+    type_filter = f1.selectbox("Type", ["All", "Income", "Expense"], key="hist_type")
+    category_filter = f2.selectbox("Category", ["All"] + EXPENSE_CATEGORIES + ["Deposit"], key="hist_cat")
+    date_range = f3.date_input("Date range", value=(), max_value=date.today(), key="hist_dates")
+    page_size = f4.selectbox("Rows per page", [10, 25, 50, 100], key="hist_page_size")
+
+    # Any filter change starts again from the first page.
+    # hist_cursors holds the keyset cursor that opened each visited page.
+    filters = (type_filter, category_filter, tuple(date_range), page_size)
+    if st.session_state.get("hist_filters") != filters:
+        st.session_state.hist_filters = filters
+        st.session_state.hist_cursors = [None]
+
+    history, next_cursor = get_transactions_page(
+        user_id,
+        limit=page_size,
+        after=st.session_state.hist_cursors[-1],
+        type_=type_filter.lower() if type_filter != "All" else None,
+        category=category_filter if category_filter != "All" else None,
+        start_date=date_range[0] if len(date_range) > 0 else None,
+        end_date=date_range[1] + timedelta(days=1) if len(date_range) > 1 else None
+    )
+
+    if history:
+        df_history = pd.DataFrame(history)[['date', 'type', 'category', 'amount', 'note']]
+        df_history['amount'] = df_history['amount'].astype(float).round(2)
+        st.dataframe(df_history.style.format({'amount': '{:.2f}'}), hide_index=True)
+    else:
+        st.info("No transactions match these filters.")
+
+    p1, p2, p3 = st.columns([1, 1, 4])
+    p1.button("← Previous", key="hist_prev", on_click=_prev_history_page,
+              disabled=len(st.session_state.hist_cursors) <= 1)
+    p2.button("Next →", key="hist_next", on_click=_next_history_page, args=(next_cursor,),
+              disabled=next_cursor is None)
+    p3.markdown(f"Page {len(st.session_state.hist_cursors)}")
+
     # --- SAVINGS GOALS ---
     st.markdown("<div class='section-card'><h3>🎯 Savings Goals Management</h3></div>", unsafe_allow_html=True)
     col1, col2 = st.columns(2)
@@ -1,8 +1,9 @@
 import streamlit as st
+import logging
 import re
 from pathlib import Path
 from utils.styles import register_css
-from database.db_methods import create_user, get_user_by_email
+from utils.auth import register_user
 
 def is_strong_password(password):
         # Al menos 8 caracteres, 1 dígito, 1 letra, 1 caracter especial
@@ -34,18 +35,19 @@ def run():
         elif password != confirm_password:
             st.error("Passwords do not match!")
         else:
-            # Verificar si el email ya existe en la DB
-            existing_user = get_user_by_email(email)
-            if existing_user:
+            # Un solo INSERT: el UNIQUE del email detecta cuentas existentes
+            try:
+                user_id = register_user(name=name, email=email, password=password)
+            except Exception as e:
+                logging.exception(f"Error registering user: {str(e)}")
+                user_id = False
+            if user_id:
+                st.success(f"User {name} registered successfully!")
+                st.session_state.page = "login"
+            elif user_id is None:
                 st.error("User with this email already exists.")
             else:
-                # Crear usuario en la DB
-                user_id = create_user(name=name, email=email, password=password)
-                if user_id:
-                    st.success(f"User {name} registered successfully!")
-                    st.session_state.page = "login"
-                else:
-                    st.error("Error creating user. Please try again.")
+                st.error("Error creating user. Please try again.")
 
     if st.button("Go to Login"):
         st.session_state.page = "login"
@@ -0,0 +1,100 @@
+# services/auth_service.py
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt
+import streamlit as st
+from database.db_methods import create_user, get_user_by_email, update_user_info
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_BCRYPT_ROUNDS = 12
+
+@st.cache_resource(show_spinner=False)
+def _get_hash_pool():
+    """
+    Bounded worker pool shared by every session. bcrypt releases the GIL, so
+    hashes run in parallel up to AUTH_HASH_WORKERS and extra logins queue here
+    instead of piling CPU work onto the Streamlit script threads.
+    """
+    return ThreadPoolExecutor(
+        max_workers=int(st.secrets.get("AUTH_HASH_WORKERS", 2)),
+        thread_name_prefix="bcrypt"
+    )
+
+def bcrypt_rounds() -> int:
+    return int(st.secrets.get("BCRYPT_ROUNDS", DEFAULT_BCRYPT_ROUNDS))
+
+def _run(func):
+    """Runs func in the hash pool and waits for it (AUTH_HASH_TIMEOUT seconds at most)."""
+    future = _get_hash_pool().submit(func)
+    try:
+        return future.result(timeout=float(st.secrets.get("AUTH_HASH_TIMEOUT", 10)))
+    except FutureTimeout:
+        future.cancel()
+        raise
+
+def _as_bytes(hashed):
+    return hashed.tobytes() if hasattr(hashed, "tobytes") else bytes(hashed)
+
+# ---------------- HASHING ----------------
+def hash_password(password: str) -> bytes:
+    rounds = bcrypt_rounds()
+    return _run(lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)))
+
+def check_password(password: str, hashed) -> bool:
+    hashed = _as_bytes(hashed)
+    return _run(lambda: bcrypt.checkpw(password.encode(), hashed))
+
+def needs_rehash(hashed) -> bool:
+    """True when the stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        cost = int(_as_bytes(hashed).split(b"$")[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != bcrypt_rounds()
+
+def _rehash(user_id, password):
+    try:
+        rounds = bcrypt_rounds()
+        update_user_info(user_id, password_hash=bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)))
+        logging.info(f"Rehashed password of user {user_id} with cost {rounds}.")
+    except Exception as e:
+        logging.error(f"Rehash failed for user {user_id}: {str(e)}")
+
+# ---------------- ACCOUNT OPERATIONS ----------------
+def register(name, email, password):
+    """
+    Creates the account in one round trip. Returns the new id, None if the
+    email is taken, or False if the password could not be hashed in time.
+    """
+    try:
+        password_hash = hash_password(password)
+    except FutureTimeout:
+        logging.error("Password hashing timed out; hash pool is saturated.")
+        return False
+    return create_user(name, email, password_hash)
+
+def authenticate(email, password):
+    """Returns {"id", "name", "email"} when the credentials match, else None."""
+    user = get_user_by_email(email)
+    if not user:
+        return None
+    try:
+        valid = check_password(password, user[3])
+    except FutureTimeout:
+        logging.error("Password check timed out; hash pool is saturated.")
+        return None
+    if not valid:
+        return None
+    if needs_rehash(user[3]):
+        # Upgrade the stored hash in the background, the login doesn't wait for it
+        _get_hash_pool().submit(_rehash, user[0], password)
+    return {"id": user[0], "name": user[1], "email": user[2]}
+
+def update_profile(user_id, name=None, password=None):
+    try:
+        password_hash = hash_password(password) if password else None
+    except FutureTimeout:
+        logging.error("Password hashing timed out; hash pool is saturated.")
+        return False
+    return update_user_info(user_id, name=name, password_hash=password_hash)
@@ -0,0 +1,137 @@
+# services/deal_ranker.py
+import logging
+import re
+from functools import lru_cache
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+# Weights of each signal in the deal score (all signals are in [0, 1])
+W_ALTERNATIVES = 0.45   # best price vs median of the other stores
+W_UNIT_PRICE = 0.25     # unit price vs similar products of the category
+W_DROP = 0.15           # % below the product's 30-day median (price history)
+W_CATEGORY = 0.15       # user's spend share of the category
+
+DEFAULT_TOP_K = 12      # products sent to the LLM
+
+_MULTIPACK = re.compile(r"(\d+)\s*[x×]\s*(\d+(?:\.\d+)?)\s*(kg|g|ml|cl|l|ltr|litres?)\b", re.I)
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|ml|cl|l|ltr|litres?)\b", re.I)
+_COUNT = re.compile(r"(\d+)\s*(?:x\b|pk\b|pack\b|rolls?\b|sheets\b|tablets\b|capsules\b|pods\b|bags\b|wipes\b)", re.I)
+# to kg / litre
+_UNITS = {"kg": ("kg", 1.0), "g": ("kg", 0.001), "l": ("l", 1.0), "ltr": ("l", 1.0), "litre": ("l", 1.0),
+          "litres": ("l", 1.0), "ml": ("l", 0.001), "cl": ("l", 0.01)}
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(title: str):
+    """
+    Pack size from a product title as (quantity, unit) with unit "kg", "l" or
+    "each", e.g. "Toilet Tissue 9 x 400g" → (3.6, "kg"), "Dishwasher Tablets 30 pack"
+    → (30, "each"). (None, None) if the title has no size.
+    """
+    title = title or ""
+    match = _MULTIPACK.search(title)
+    if match:
+        unit, factor = _UNITS[match.group(3).lower()]
+        return int(match.group(1)) * float(match.group(2)) * factor, unit
+    match = _SIZE.search(title)
+    if match:
+        unit, factor = _UNITS[match.group(2).lower()]
+        return float(match.group(1)) * factor, unit
+    match = _COUNT.search(title)
+    if match and int(match.group(1)) > 0:
+        return float(match.group(1)), "each"
+    return None, None
+
+
+def spend_weights(category_totals: list, category_to_query: dict) -> dict:
+    """
+    {query: share of the user's spend}, from get_category_totals rows. Shares
+    are rounded to 5% so users with similar spending share cached deals.
+    """
+    spend = {}
+    for row in category_totals or []:
+        query = category_to_query.get(row.get("category"))
+        if query:
+            spend[query] = spend.get(query, 0.0) + float(row.get("amount") or 0)
+    total = sum(spend.values())
+    if total <= 0:
+        return {}
+    return {q: round(v / total * 20) / 20 for q, v in sorted(spend.items())}
+
+
+def _relative_saving(prices, reference):
+    """(reference - price) / reference clipped to [0, 1]; 0 where there is no reference."""
+    saving = np.zeros_like(prices)
+    known = np.isfinite(reference) & (reference > 0)
+    saving[known] = (reference[known] - prices[known]) / reference[known]
+    return np.clip(saving, 0.0, 1.0)
+
+
+def score_products(products: list, category_weights: dict = None) -> np.ndarray:
+    """Deal score per product (higher is better), all signals computed as one batch."""
+    n = len(products)
+    if not n:
+        return np.zeros(0)
+    prices = np.array([float(p.get("best_price") or np.nan) for p in products])
+
+    # 1) Best price vs the median of the other stores' prices for the same product
+    width = max((len(p.get("other_prices") or []) for p in products), default=0)
+    others = np.full((n, max(width, 1)), np.nan)
+    for i, p in enumerate(products):
+        alt = p.get("other_prices") or []
+        others[i, :len(alt)] = alt
+    has_alt = np.isfinite(others).any(axis=1)
+    alt_median = np.full(n, np.nan)
+    if has_alt.any():
+        alt_median[has_alt] = np.nanmedian(others[has_alt], axis=1)
+    alt_saving = _relative_saving(prices, alt_median)
+
+    # 2) Unit price vs the median unit price of the same category and unit
+    quantities = [parse_quantity(p.get("title")) for p in products]
+    amounts = np.array([q or np.nan for q, _ in quantities])
+    unit_prices = prices / amounts
+    groups = np.array([f"{p.get('category')}|{unit}" for p, (_, unit) in zip(products, quantities)])
+    unit_reference = np.full(n, np.nan)
+    for group in np.unique(groups[np.isfinite(unit_prices)]):
+        members = (groups == group) & np.isfinite(unit_prices)
+        if members.sum() > 1:
+            unit_reference[members] = np.median(unit_prices[members])
+    unit_saving = _relative_saving(unit_prices, unit_reference)
+
+    # 3) Recent price drop
+    drop = np.clip(np.array([float(p.get("drop_pct") or 0) for p in products]) / 100, 0.0, 1.0)
+
+    # 4) Category weight: spend share, uniform without spending data
+    weights = category_weights or {}
+    default_share = 1.0 / max(len({p.get("category") for p in products}), 1)
+    share = np.array([float(weights.get(p.get("category"), 0.0 if weights else default_share)) for p in products])
+
+    score = W_ALTERNATIVES * alt_saving + W_UNIT_PRICE * unit_saving + W_DROP * drop + W_CATEGORY * share
+    score[~np.isfinite(prices)] = -np.inf
+    return score
+
+
+def rank_products(products: list, category_weights: dict = None, top_k: int = None) -> list:
+    """
+    Products with a price, best deal first (stable for equal scores), without
+    repeats of the same title at the same store. Each gets its "deal_score".
+    """
+    seen, unique = set(), []
+    for p in products:
+        identity = (p.get("title"), p.get("store"))
+        if p.get("best_price") and identity not in seen:
+            seen.add(identity)
+            unique.append(p)
+    if not unique:
+        return []
+    scores = score_products(unique, category_weights)
+    order = np.argsort(-scores, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    ranked = []
+    for i in order:
+        product = unique[i]
+        product["deal_score"] = round(float(scores[i]), 3)
+        ranked.append(product)
+    return ranked
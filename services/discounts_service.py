@@ -1,17 +1,54 @@
 # services/discounts_service.py
+import json
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
 import streamlit as st
-from utils.scraper import get_products_by_categories, get_best_store_info
-from utils.openai import analyze_products_with_llm
+from services.price_store import get_category_products, add_best_prices
+from services.deal_ranker import rank_products, DEFAULT_TOP_K
+from services.price_refresher import note_viewed, refresh_on_demand
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.openai import analyze_products_with_llm, stream_products_with_llm
+from utils.singleflight import SingleFlight, FileSingleFlight
+from cachetools import TTLCache
 import random
 
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_LATENCY_BUDGET = 6.0  # seconds the Dashboard waits for deals
+
+class PriceStoreNotReady(Exception):
+    """No priced products yet (cold start, before the refresher's first pass)."""
+
+# Deals are computed off the script thread so the budget can be enforced; a
+# computation that overruns keeps going and its result is kept for next time.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="discounts")
+_last_good = {}
+_last_good_lock = threading.Lock()
+# Finished streamed answers, so reruns of the page don't stream again
+_streamed = TTLCache(maxsize=512, ttl=3600)
+# Sessions asking for the same deals at once share one computation / stream
+_flight = SingleFlight()
+
+@st.cache_resource(show_spinner=False)
+def _get_llm_breaker():
+    # No background probe: a probe would be a paid LLM call, so recovery is a
+    # single trial request once LLM_BREAKER_RESET has passed
+    return CircuitBreaker(
+        "llm",
+        failure_threshold=int(st.secrets.get("LLM_BREAKER_FAILURES", 3)),
+        reset_timeout=float(st.secrets.get("LLM_BREAKER_RESET", 60))
+    )
+
 @st.cache_data(ttl=3600)
-def get_top_discounts_simple(products: list, num_to_select: int = 5) -> list:
+def get_top_discounts_simple(products: list, num_to_select: int = 5, category_weights: dict = None) -> list:
     if not products:
         return []
-    selected = random.sample(products, min(num_to_select, len(products)))
+    # Best scored deals (services/deal_ranker.py), no LLM involved
+    selected = rank_products(products, category_weights, num_to_select)
     ai_templates = [
         "According to your recent spending patterns, you might benefit from reducing your expenses in the <span style='font-weight: bold;'>{category}</span> category. I found an offer at <span style='font-weight: bold;'>{store}</span>: the product '<span style='font-weight: bold;'>{title}</span>' is available for <span style='font-weight: bold;'>£{price}</span>. You can check it here: <a href='{link}' target='_blank' style='color: blue; text-decoration: underline;'>{link}</a>.",
         "Based on how you've been spending lately, you seem to be investing quite a bit in <span style='font-weight: bold;'>{category}</span>. A good deal I found for you is at <span style='font-weight: bold;'>{store}</span>: '<span style='font-weight: bold;'>{title}</span>' for only <span style='font-weight: bold;'>£{price}</span>. Here is the direct link: <a href='{link}' target='_blank' style='color: blue; text-decoration: underline;'>{link}</a>.",
@@ -40,53 +77,266 @@ def get_top_discounts_simple(products: list, num_to_select: int = 5) -> list:
     
     return messages[:3]
 
-@st.cache_data(ttl=3600)
-def get_top_discounts(queries: list[str], user_context: dict = None) -> list:
+def _remember(key, future):
+    try:
+        deals = future.result()
+    except Exception:
+        return
+    if deals:
+        with _last_good_lock:
+            _last_good[key] = deals
+
+def _fallback_deals(queries: tuple, category_weights: dict = None) -> list:
+    """Template deals from the price store only (no LLM)."""
+    products = add_best_prices(get_category_products(list(queries), None, scrape_missing=False), scrape_missing=False)
+    return get_top_discounts_simple([p for p in products if p.get("store") and p.get("best_price")], 3, category_weights)
+
+def _top_k() -> int:
+    return int(st.secrets.get("DEAL_RANKER_TOP_K", DEFAULT_TOP_K))
+
+@st.cache_resource(show_spinner=False)
+def _get_file_flight():
+    # Cross-process coalescing, for deployments running several app processes
+    if not st.secrets.get("DISCOUNTS_FILE_LOCK", False):
+        return None
+    directory = st.secrets.get("DISCOUNTS_FLIGHT_DIR", str(Path(__file__).parent.parent / ".cache" / "flights"))
+    return FileSingleFlight(directory, share_window=float(st.secrets.get("DISCOUNTS_FLIGHT_SHARE_WINDOW", 60)))
+
+def _request_key(key: tuple, user_context: dict = None, category_weights: dict = None) -> str:
+    context = json.dumps([user_context or {}, category_weights or {}], sort_keys=True, default=str)
+    return f"{','.join(key)}|{context}"
+
+def _compute_top_discounts(key, user_context, category_weights, flight_key):
+    file_flight = _get_file_flight()
+    if file_flight is None:
+        return _get_top_discounts(key, user_context, category_weights)
+    return file_flight.do(flight_key, lambda: _get_top_discounts(key, user_context, category_weights))
+
+def flight_stats() -> dict:
+    """Coalescing metrics: totals, callers coalesced per request key, cross-process flights."""
+    file_flight = _get_file_flight()
+    return {
+        "in_process": _flight.stats(),
+        "per_key": _flight.key_stats(),
+        "cross_process": file_flight.stats() if file_flight else None,
+    }
+
+def _fill(deals: list, picked: list, products: list, category_weights: dict = None) -> list:
+    """Tops deals up to 3 with the best ranked products the LLM didn't pick."""
+    taken = {(p.get("title"), p.get("store")) for p in picked}
+    rest = [p for p in products if (p.get("title"), p.get("store")) not in taken]
+    return deals + get_top_discounts_simple(rest, 3, category_weights)[:max(0, 3 - len(deals))]
+
+def get_top_discounts(queries: list[str], user_context: dict = None, category_weights: dict = None) -> list:
     """
-    Scrapea categorías → obtiene mejores precios → manda a IA → fallback si falla.
+    Normaliza las categorías (orden y duplicados) para que usuarios con el mismo
+    conjunto compartan resultado.
+    Waits at most DISCOUNTS_LATENCY_BUDGET seconds; past that, or while the LLM
+    circuit is open, the last good deals for these categories are served (or
+    template deals if there are none yet).
+    category_weights ({query: spend share}, see deal_ranker.spend_weights)
+    favours the categories the user spends most on.
+    Concurrent identical requests share one in-flight computation.
     """
-    # 1) Products scraping
-    scraped = get_products_by_categories(queries)
+    key = tuple(sorted(set(queries)))
+    note_viewed(key)
+    flight_key = _request_key(key, user_context, category_weights)
+    future, leader = _flight.join(
+        flight_key,
+        lambda: _executor.submit(_compute_top_discounts, key, user_context, category_weights, flight_key)
+    )
+    if leader:
+        future.add_done_callback(lambda f: _remember(key, f))
+    try:
+        return future.result(timeout=float(st.secrets.get("DISCOUNTS_LATENCY_BUDGET", DEFAULT_LATENCY_BUDGET)))
+    except FutureTimeout:
+        logging.warning(f"Deals for {key} over the latency budget, serving fallback.")
+    except CircuitOpenError:
+        logging.info("LLM circuit open, serving fallback deals.")
+    except PriceStoreNotReady as e:
+        logging.info(f"{str(e)}, serving fallback deals.")
+    except Exception as e:
+        logging.error(f"Deals error: {str(e)}")
+
+    with _last_good_lock:
+        last_good = _last_good.get(key)
+    return last_good or _fallback_deals(key, category_weights)
+
+def _detailed_products(queries, category_weights: dict = None) -> list:
+    """Products of the price store with a best price, best deals first (None if the store is empty)."""
+    # 1) Every stored product per category, precomputed by the background refresher;
+    # the ranking below (not a random sample) picks what goes to the LLM
+    scraped = get_category_products(list(queries), None, scrape_missing=False)
+    # Categories not in the store yet are fetched in the background, ahead of routine refreshes
+    missing = set(queries) - {p.get("category") for p in scraped}
+    if missing:
+        refresh_on_demand(sorted(missing))
     if not scraped:
-        logging.warning("No products scraped.")
-        return []
+        logging.warning("No products in the price store yet.")
+        return None
     # 2) Add info and best prices
-    detailed = get_best_store_info(scraped)
+    detailed = add_best_prices(scraped, scrape_missing=False)
     # Filter only those with store and price
     detailed_products = [p for p in detailed if p.get("store") and p.get("best_price")]
+    # 3) Deterministic pre-ranking: only the top DEAL_RANKER_TOP_K go to the LLM
+    return rank_products(detailed_products, category_weights)
+
+def _format_deal(item: dict) -> dict:
+    text = (
+        f"<a href='{item.get('store_link', '#')}' target='_blank' ""style='color: blue; text-decoration: underline;'>"
+        f"<span style='font-weight: bold;'>{item.get('title')}</span> — "
+        f"<span style='font-weight: bold;'>£{item.get('best_price')}</span> "
+        f"({item.get('justification', '')})"
+        "</a>"
+    )
+    return {"text": text}  # Excel a 'text'
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _get_top_discounts(queries: tuple, user_context: dict = None, category_weights: dict = None) -> list:
+    """
+    Productos precalculados del price store → mejores precios → manda a IA → fallback si falla.
+    Nunca scrapea: services/price_refresher.py mantiene el store actualizado.
+    """
+    detailed_products = _detailed_products(queries, category_weights)
     if not detailed_products:
-        return get_top_discounts_simple([], 5)
-    # 3) Payload for IA
+        # Raised, not returned: st.cache_data would keep an empty answer for an hour
+        raise PriceStoreNotReady(f"No priced products for {queries} yet")
+    # 4) Payload for IA
     payload = {
         "user_summary": user_context or {},
-        "products": detailed_products
+        "products": detailed_products[:_top_k()]
     }
 
     try:
-        result = analyze_products_with_llm(payload)
+        # analyze_products_with_llm returns None on any error, count that as a failure
+        result = _get_llm_breaker().call(lambda: analyze_products_with_llm(payload), is_failure=lambda r: r is None)
 
         if result and isinstance(result, dict) and result.get("selected"):
-            formatted = []
-            for item in result["selected"][:5]:
-                text = (
-                    f"<a href='{item.get('store_link', '#')}' target='_blank' ""style='color: blue; text-decoration: underline;'>"
-                    f"<span style='font-weight: bold;'>{item.get('title')}</span> — "
-                    f"<span style='font-weight: bold;'>£{item.get('best_price')}</span> "
-                    f"({item.get('justification', '')})"
-                    "</a>"
-                )
-                formatted.append({"text": text})  # Excel a 'text'
+            formatted = [_format_deal(item) for item in result["selected"][:5]]
             # Fill if less than 3
-            while len(formatted) < 3:
-                extra = get_top_discounts_simple(detailed_products, 1)
-                if not extra:
-                    break
-                formatted.extend(extra)
-
-            return formatted[:3]
+            return _fill(formatted, result["selected"], detailed_products, category_weights)[:3]
         # IA failed, fallback
-        return get_top_discounts_simple(detailed_products, 3)
+        return get_top_discounts_simple(detailed_products, 3, category_weights)
     
+    except CircuitOpenError:
+        raise  # not cached: the LLM is retried once the circuit closes
     except Exception as e:
         logging.error(f"IA error: {str(e)}")
-        return get_top_discounts_simple(detailed_products, 3)
+        return get_top_discounts_simple(detailed_products, 3, category_weights)
+
+# ---------------- STREAMING ----------------
+class _DealStream:
+    """
+    One streamed LLM answer, readable by every session asking for the same
+    deals: the producer appends events, each reader keeps its own position.
+    """
+
+    def __init__(self, payload):
+        self._cond = threading.Condition()
+        self._events = []
+        self.future = _executor.submit(self._produce, payload)
+
+    def _produce(self, payload):
+        try:
+            for deal in stream_products_with_llm(payload):
+                self._push(("deal", deal))
+        except Exception as e:
+            self._push(("error", e))
+        else:
+            self._push(("end", None))
+
+    def _push(self, event):
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def get(self, index: int, timeout: float):
+        """The index-th event, ("deal" | "end" | "error", value); queue.Empty after timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._events) > index, timeout):
+                raise queue.Empty
+            return self._events[index]
+
+    def add_done_callback(self, fn):
+        self.future.add_done_callback(lambda _: fn(self))
+
+def stream_top_discounts(queries: list[str], user_context: dict = None, category_weights: dict = None):
+    """
+    Like get_top_discounts, but yields each deal ({"text"}) as soon as the LLM
+    completes it, so the page can show the first one early. The same latency
+    budget applies to the whole stream: deals received by then are kept and
+    the rest are filled with template deals. Finished answers are reused for
+    an hour per category set and context, and sessions asking while a stream
+    is running read that stream instead of starting their own.
+    """
+    key = tuple(sorted(set(queries)))
+    note_viewed(key)
+    stream_key = _request_key(key, user_context, category_weights)
+    with _last_good_lock:
+        finished = _streamed.get(stream_key)
+    if finished:
+        yield from finished
+        return
+
+    products = _detailed_products(key, category_weights)
+    if not products:
+        yield from get_top_discounts_simple(products or [], 3)
+        return
+
+    breaker = _get_llm_breaker()
+
+    def start():
+        if not breaker.allow():
+            raise CircuitOpenError("Circuit 'llm' is open")
+        return _DealStream({"user_summary": user_context or {}, "products": products[:_top_k()]})
+
+    try:
+        stream, leader = _flight.join("stream:" + stream_key, start)
+    except CircuitOpenError:
+        logging.info("LLM circuit open, serving fallback deals.")
+        with _last_good_lock:
+            last_good = _last_good.get(key)
+        yield from last_good or get_top_discounts_simple(products, 3, category_weights)
+        return
+
+    deadline = time.monotonic() + float(st.secrets.get("DISCOUNTS_LATENCY_BUDGET", DEFAULT_LATENCY_BUDGET))
+    deals, picked, outcome = [], [], None
+    try:
+        while len(deals) < 3:
+            try:
+                kind, value = stream.get(len(deals), timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                logging.warning(f"Streamed deals for {key} over the latency budget after {len(deals)} deals.")
+                outcome = "timeout"
+                break
+            if kind == "deal":
+                deal = _format_deal(value)
+                deals.append(deal)
+                picked.append(value)
+                yield deal
+            else:
+                if kind == "error":
+                    logging.error(f"Deals stream error: {str(value)}")
+                outcome = kind
+                break
+        else:
+            outcome = "end"
+    finally:
+        # Only the session that started the stream reports to the breaker;
+        # outcome is None when the page stopped consuming early (rerun).
+        # "error" covers failed requests and unparseable replies
+        if leader:
+            if outcome == "end" or (outcome == "timeout" and deals):
+                breaker.record_success()
+            elif outcome is None:
+                breaker.cancel()
+            else:
+                breaker.record_failure()
+
+    if deals:
+        with _last_good_lock:
+            _last_good[key] = deals
+            if outcome == "end":
+                _streamed[stream_key] = list(deals)
+    # Fill if less than 3
+    yield from _fill([], picked, products, category_weights)[:3 - len(deals)]
@@ -0,0 +1,148 @@
+# services/price_refresher.py
+# Keeps the price store warm so request-time code never scrapes.
+#   - In the app: start_background_refresher() runs a daemon thread per process.
+#   - Standalone: python -m services.price_refresher
+# Categories the Dashboard has read recently are refreshed first, at
+# interactive priority; categories missing from the store are fetched on
+# demand, off the request path.
+import logging
+import random
+import threading
+import time
+import streamlit as st
+from services.price_store import (
+    CATEGORY_TO_QUERY, load_categories, prune_price_history, refresh_categories, refresh_store_prices
+)
+from utils.scraper import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_INTERVAL = 1800   # seconds between refreshes, below the store TTL
+DEFAULT_JITTER = 0.1      # ±10% so processes don't refresh in lockstep
+PRUNE_EVERY = 86400       # seconds between price history clean-ups
+DEFAULT_DEADLINE = 300    # per batch; background pages wait behind users' and under the rate limit
+ON_DEMAND_COOLDOWN = 300  # seconds before a missing category is fetched on demand again
+
+# In-process record of what pages read: {query: last time}
+_viewed = {}
+_on_demand_at = {}
+_views_lock = threading.Lock()
+
+def note_viewed(queries):
+    """Called on every Dashboard read of these categories."""
+    now = time.time()
+    with _views_lock:
+        for query in queries:
+            _viewed[query] = now
+
+def recently_viewed(within: float) -> list:
+    """Queries read in the last `within` seconds, most recent first."""
+    since = time.time() - within
+    with _views_lock:
+        return [q for q, t in sorted(_viewed.items(), key=lambda item: -item[1]) if t >= since]
+
+def refresh_on_demand(queries):
+    """
+    Queues an interactive-priority refresh of categories missing from the
+    store and returns at once; each category at most once per ON_DEMAND_COOLDOWN.
+    """
+    now = time.time()
+    with _views_lock:
+        queries = [q for q in queries if now - _on_demand_at.get(q, 0) > ON_DEMAND_COOLDOWN]
+        for query in queries:
+            _on_demand_at[query] = now
+    if not queries:
+        return
+    logging.info(f"Price store miss for {queries}, refreshing on demand.")
+    # Daemon thread like the refresher's: never holds up process exit
+    threading.Thread(target=_refresh_quietly, args=(queries, PRIORITY_INTERACTIVE),
+                     name="price-on-demand", daemon=True).start()
+
+def _refresh_quietly(queries, priority):
+    try:
+        refresh_prices(queries, priority=priority)
+    except Exception as e:
+        logging.error(f"On-demand price refresh failed: {str(e)}")
+
+def refresh_prices(queries=None, max_age=None, priority=PRIORITY_BACKGROUND) -> dict:
+    """
+    Re-scrapes the given queries (default: every dashboard category) and their
+    product pages into the price store. With max_age, queries refreshed more
+    recently than that (e.g. by another process) are skipped.
+    """
+    queries = list(queries or CATEGORY_TO_QUERY.values())
+    if max_age is not None:
+        recent = load_categories(queries, max_age=max_age)
+        queries = [q for q in queries if q not in recent]
+    if not queries:
+        return {"categories": 0, "products": 0, "seconds": 0.0}
+
+    deadline = float(st.secrets.get("PRICE_REFRESH_DEADLINE", DEFAULT_DEADLINE))
+    start = time.perf_counter()
+    categories = refresh_categories(queries, deadline, priority)
+    hrefs = [p["href"] for products in categories.values() for p in products if p.get("href")]
+    prices = refresh_store_prices(hrefs, deadline, priority)
+    seconds = time.perf_counter() - start
+    logging.info(f"Price refresh: {len(categories)}/{len(queries)} categories, {len(prices)}/{len(hrefs)} products in {seconds:.1f}s")
+    return {"categories": len(categories), "products": len(prices), "seconds": seconds}
+
+
+class PriceRefresher:
+    """Re-scrapes every `interval` seconds (± jitter) on a daemon thread."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER):
+        self.interval = interval
+        self.jitter = jitter
+        self.last_run = None
+        self.last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run_forever, name="price-refresher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        # Short random start-up delay: processes booted together don't all scrape at once
+        delay = random.uniform(0, min(30, self.interval * self.jitter))
+        while not self._stop.wait(delay):
+            try:
+                max_age = self.interval * (1 - self.jitter)
+                # What users are looking at first, ahead of the rest in the crawl queue
+                viewed = [q for q in recently_viewed(self.interval) if q in CATEGORY_TO_QUERY.values()]
+                first = refresh_prices(viewed, max_age=max_age, priority=PRIORITY_INTERACTIVE) if viewed else {}
+                rest = [q for q in CATEGORY_TO_QUERY.values() if q not in viewed]
+                self.last_run = refresh_prices(rest, max_age=max_age) if rest else first
+                if time.time() - self.last_prune > PRUNE_EVERY:
+                    removed = prune_price_history()
+                    self.last_prune = time.time()
+                    logging.info(f"Pruned {removed} old price history rows.")
+            except Exception as e:
+                logging.error(f"Price refresh failed: {str(e)}")
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def _settings():
+    return (
+        float(st.secrets.get("PRICE_REFRESH_INTERVAL", DEFAULT_INTERVAL)),
+        float(st.secrets.get("PRICE_REFRESH_JITTER", DEFAULT_JITTER))
+    )
+
+@st.cache_resource(show_spinner=False)
+def start_background_refresher():
+    """Starts one refresher thread per process unless PRICE_REFRESH_IN_APP is false."""
+    if not st.secrets.get("PRICE_REFRESH_IN_APP", True):
+        return None
+    interval, jitter = _settings()
+    return PriceRefresher(interval, jitter).start()
+
+
+if __name__ == "__main__":
+    from database.database import init_db
+    init_db()
+    interval, jitter = _settings()
+    logging.info(f"Price refresher worker started (every {interval:.0f}s ±{jitter:.0%}).")
+    PriceRefresher(interval, jitter).run_forever()
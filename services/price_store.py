@@ -0,0 +1,232 @@
+# services/price_store.py
+import json
+import logging
+import math
+import time
+import streamlit as st
+from database.database import get_backend, get_connection
+from utils.scraper import (
+    PRIORITY_INTERACTIVE, apply_best_store, get_products_by_categories, get_store_prices
+)
+
+logging.basicConfig(level=logging.INFO)
+
+# Scraped search results and product price tables, shared by every process and
+# user through the database. Entries older than their TTL are treated as missing.
+DEFAULT_CATEGORY_TTL = 3600
+DEFAULT_PRODUCT_TTL = 3600
+
+# Price history: drops are measured against the median of this window, and
+# observations older than the retention period are pruned by the refresher
+DEFAULT_DROP_WINDOW_DAYS = 30
+DEFAULT_HISTORY_RETENTION_DAYS = 90
+
+# Dashboard expense category → trolley.co.uk search query
+CATEGORY_TO_QUERY = {
+    "Groceries": "groceries",
+    "Health & Beauty": "health+beauty",
+    "Cleaning": "cleaning",
+    "Online Shopping": "online+shopping",
+    "Others": "other"
+}
+
+def _ttl(name, default):
+    return float(st.secrets.get(name, default))
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+# ---------------- RAW STORE ----------------
+def _freshness_filter(max_age):
+    """SQL condition + params for entries younger than max_age (math.inf = any age)."""
+    if math.isinf(max_age):
+        return "", []
+    return " AND fetched_at >= %s", [time.time() - max_age]
+
+def load_categories(queries, max_age=None) -> dict:
+    """{query: [products]} for every query with a fresh entry."""
+    queries = list(set(queries))
+    if not queries:
+        return {}
+    max_age = _ttl("PRICE_STORE_CATEGORY_TTL", DEFAULT_CATEGORY_TTL) if max_age is None else max_age
+    condition, params = _freshness_filter(max_age)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT query, products FROM scraped_categories WHERE query IN ({_placeholders(queries)}){condition}",
+            queries + params
+        )
+        rows = cursor.fetchall()
+    return {r[0]: json.loads(r[1]) for r in rows}
+
+def save_categories(products_by_query: dict):
+    if not products_by_query:
+        return
+    now = time.time()
+    with get_connection() as conn:
+        get_backend().insert_many(conn.cursor(), """
+            INSERT INTO scraped_categories (query, products, fetched_at) VALUES %s
+            ON CONFLICT (query) DO UPDATE SET products = EXCLUDED.products, fetched_at = EXCLUDED.fetched_at
+        """, sorted((q, json.dumps(p), now) for q, p in products_by_query.items()))
+
+def load_store_prices(hrefs, max_age=None) -> dict:
+    """{href: [{"store", "price", "link"}, ...]} for every href with a fresh entry."""
+    hrefs = list({h for h in hrefs if h})
+    if not hrefs:
+        return {}
+    max_age = _ttl("PRICE_STORE_PRODUCT_TTL", DEFAULT_PRODUCT_TTL) if max_age is None else max_age
+    condition, params = _freshness_filter(max_age)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT href, stores FROM scraped_products WHERE href IN ({_placeholders(hrefs)}){condition}",
+            hrefs + params
+        )
+        rows = cursor.fetchall()
+    return {r[0]: json.loads(r[1]) for r in rows}
+
+def save_store_prices(prices: dict):
+    """
+    Stores the latest table per href, appends every (store, price) seen to
+    price_history and folds the best price into the product's price_daily row.
+    """
+    if not prices:
+        return
+    now = time.time()
+    observations = [
+        (href, entry["store"] or "Unknown", float(entry["price"]), now)
+        for href, entries in prices.items() for entry in entries
+    ]
+    day = int(now // 86400)
+    daily = sorted(
+        (href, day, best, best, now)
+        for href, best in ((h, min(float(e["price"]) for e in entries)) for h, entries in prices.items() if entries)
+    )
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        backend = get_backend()
+        backend.insert_many(cursor, """
+            INSERT INTO scraped_products (href, stores, fetched_at) VALUES %s
+            ON CONFLICT (href) DO UPDATE SET stores = EXCLUDED.stores, fetched_at = EXCLUDED.fetched_at
+        """, sorted((h, json.dumps(entries), now) for h, entries in prices.items()))
+        backend.insert_many(cursor, "INSERT INTO price_history (href, store, price, observed_at) VALUES %s", observations)
+        backend.insert_many(cursor, """
+            INSERT INTO price_daily (href, day, best_price, last_price, last_at) VALUES %s
+            ON CONFLICT (href, day) DO UPDATE SET
+                best_price = CASE WHEN EXCLUDED.best_price < price_daily.best_price
+                                  THEN EXCLUDED.best_price ELSE price_daily.best_price END,
+                last_price = EXCLUDED.last_price,
+                last_at = EXCLUDED.last_at
+        """, daily)
+
+# ---------------- PRICE HISTORY ----------------
+def _days(name, default):
+    return float(st.secrets.get(name, default)) * 86400
+
+def get_price_drops(hrefs, window=None) -> dict:
+    """
+    {href: {"current", "median", "drop_pct"}} comparing the best price of the
+    latest scrape with the median of the product's daily best prices over the
+    window (default PRICE_DROP_WINDOW_DAYS). Read from the price_daily rollup
+    with the median computed in SQL: one row per product. Products seen on a
+    single day are left out.
+    """
+    hrefs = list({h for h in hrefs if h})
+    if not hrefs:
+        return {}
+    window = _days("PRICE_DROP_WINDOW_DAYS", DEFAULT_DROP_WINDOW_DAYS) if window is None else window
+    first_day = int((time.time() - window) // 86400)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT d.href, {get_backend().median("d.best_price")},
+                (SELECT l.last_price FROM price_daily l WHERE l.href = d.href ORDER BY l.day DESC LIMIT 1)
+            FROM price_daily d
+            WHERE d.href IN ({_placeholders(hrefs)}) AND d.day >= %s
+            GROUP BY d.href
+            HAVING COUNT(*) >= 2
+        """, hrefs + [first_day])
+        rows = cursor.fetchall()
+
+    drops = {}
+    for href, median, current in rows:
+        median, current = float(median), float(current)
+        drops[href] = {
+            "current": current,
+            "median": median,
+            "drop_pct": round((median - current) / median * 100, 1) if median else 0.0
+        }
+    return drops
+
+def find_price_drops(hrefs, min_drop_pct=10.0, window=None) -> dict:
+    """The subset of get_price_drops whose current price is at least min_drop_pct below the median."""
+    return {h: d for h, d in get_price_drops(hrefs, window).items() if d["drop_pct"] >= min_drop_pct}
+
+def prune_price_history(max_age=None) -> int:
+    """Deletes observations older than PRICE_HISTORY_RETENTION_DAYS. Returns the number removed."""
+    max_age = _days("PRICE_HISTORY_RETENTION_DAYS", DEFAULT_HISTORY_RETENTION_DAYS) if max_age is None else max_age
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM price_history WHERE observed_at < %s", (time.time() - max_age,))
+        removed = cursor.rowcount
+        cursor.execute("DELETE FROM price_daily WHERE day < %s", (int((time.time() - max_age) // 86400),))
+        return removed
+
+# ---------------- READ-THROUGH ----------------
+def refresh_categories(queries, deadline=None, priority=PRIORITY_INTERACTIVE) -> dict:
+    """Scrapes the given queries now and stores every product found (up to 10 per query)."""
+    fresh = {}
+    for product in get_products_by_categories(list(queries), deadline=deadline, sample=None, priority=priority):
+        fresh.setdefault(product["category"], []).append(product)
+    save_categories(fresh)
+    return fresh
+
+def refresh_store_prices(hrefs, deadline=None, priority=PRIORITY_INTERACTIVE) -> dict:
+    fresh = get_store_prices(hrefs, deadline, priority)
+    save_store_prices(fresh)
+    return fresh
+
+def get_category_products(queries, per_category=5, scrape_missing=True) -> list:
+    """
+    The first `per_category` products per query (all of them with None), in
+    search-result order, merged from the store. The same stored entries always
+    give the same products, so identical prompts can be answered from the LLM
+    cache. Only queries with no fresh entry are scraped. With
+    scrape_missing=False the last stored entry is served whatever its age and
+    nothing is scraped.
+    """
+    cached = load_categories(queries, max_age=None if scrape_missing else math.inf)
+    missing = [q for q in queries if q not in cached]
+    if missing and scrape_missing:
+        logging.info(f"Price store miss for {missing}, scraping.")
+        cached.update(refresh_categories(missing))
+
+    products = []
+    for query in queries:
+        available = cached.get(query, [])
+        products.extend(dict(p) for p in available[:per_category])
+    return products
+
+def add_best_prices(products: list, scrape_missing=True) -> list:
+    """
+    Fills store/best_price/store_link from the store, scraping only unknown hrefs
+    (or, with scrape_missing=False, using whatever is stored), and drop_pct
+    (% below the product's recent median price, 0 without history).
+    """
+    hrefs = [p.get("href") for p in products]
+    prices = load_store_prices(hrefs, max_age=None if scrape_missing else math.inf)
+    missing = [h for h in set(hrefs) if h and h not in prices]
+    if missing and scrape_missing:
+        prices.update(refresh_store_prices(missing))
+
+    for product in products:
+        href = product.get("href")
+        if not href:
+            apply_best_store(product, [])
+        elif href in prices:
+            apply_best_store(product, prices[href])
+
+    drops = get_price_drops(hrefs)
+    for product, href in zip(products, hrefs):
+        product["drop_pct"] = drops[href]["drop_pct"] if href in drops else 0.0
+    return products
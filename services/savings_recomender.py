@@ -3,26 +3,23 @@ import random
 from datetime import datetime
 from decimal import Decimal
 
-def generate_savings_recommendations(transactions, goals):
+def generate_savings_recommendations(category_totals, goals, has_transactions=True):
     """
     Generate AI-styled personalized savings recommendations with varied structure.
+    `category_totals` is the expense total per category as returned by
+    db_methods.get_category_totals ([{"category": ..., "amount": ...}]).
     """
     if not goals:
         return [{"text": "Add a savings goal to receive personalized tips."}]
     
-    if not transactions:
+    if not has_transactions:
         return [{"text": "No transactions recorded yet."}]
     
     # Pick up to 2 random goals to mention per tip
     goal_names_all = [g.get("name", "your goal") for g in goals]
     
-    # Aggregate expenses by category
-    category_totals = {}
-    for t in transactions:
-        if t.get("type") != "expense":
-            continue
-        cat = t.get("category", "Other")
-        category_totals[cat] = category_totals.get(cat, 0) + t.get("amount", 0)
+    # Expenses by category, already aggregated by the database
+    category_totals = {(c.get("category") or "Other"): c.get("amount", 0) for c in category_totals}
     
     if not category_totals:
         return [{"text": "No expenses to analyze for this month."}]
@@ -0,0 +1,238 @@
+# services/statement_import.py
+import csv
+import io
+import logging
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from database.db_methods import bulk_add_transactions
+
+logging.basicConfig(level=logging.INFO)
+
+# Keyword → category mapping for statement descriptions. Anything else is "Others".
+CATEGORY_KEYWORDS = {
+    "Groceries": ["tesco", "sainsbury", "asda", "aldi", "lidl", "morrisons", "waitrose",
+                  "co-op", "coop", "iceland", "ocado", "grocer", "supermarket"],
+    "Health & Beauty": ["boots", "superdrug", "pharmacy", "chemist", "beauty", "salon",
+                        "barber", "holland & barrett", "optician", "dentist"],
+    "Cleaning": ["cleaning", "cleaner", "laundry", "launderette", "dry clean", "detergent"],
+    "Online Shopping": ["amazon", "amzn", "ebay", "etsy", "asos", "shein", "argos",
+                        "paypal", "aliexpress", "online"],
+}
+DEFAULT_CATEGORY = "Others"
+INCOME_CATEGORY = "Deposit"
+
+# Header aliases used by common UK bank CSV exports
+CSV_COLUMNS = {
+    "date": ["date", "transaction date", "posted date", "posting date", "booking date", "value date"],
+    "amount": ["amount", "value", "transaction amount"],
+    "debit": ["debit", "debit amount", "paid out", "money out", "withdrawal", "out"],
+    "credit": ["credit", "credit amount", "paid in", "money in", "deposit", "in"],
+    "note": ["description", "details", "memo", "narrative", "name", "payee", "reference",
+             "transaction description", "note"],
+    "category": ["category"],
+    "type": ["type", "transaction type"],
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y", "%Y%m%d"]
+
+MAX_AMOUNT = Decimal("1000000")
+
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+# ---------------- FIELD PARSING ----------------
+def map_category(description: str, category: str = None) -> str:
+    """Maps a statement row to one of the five expense categories."""
+    if category:
+        for known in list(CATEGORY_KEYWORDS) + [DEFAULT_CATEGORY]:
+            if category.strip().lower() == known.lower():
+                return known
+    text = (description or "").lower()
+    for name, keywords in CATEGORY_KEYWORDS.items():
+        if any(k in text for k in keywords):
+            return name
+    return DEFAULT_CATEGORY
+
+
+def parse_amount(value: str):
+    """'£1,234.50' → Decimal('1234.50'); '(12.00)' → Decimal('-12.00'); '' → None."""
+    if value is None:
+        return None
+    text = value.strip().replace("£", "").replace(",", "").replace(" ", "")
+    if not text:
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    if negative:
+        text = text[1:-1]
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError(f"Invalid amount '{value.strip()}'")
+    return -amount if negative else amount
+
+
+def parse_date(value: str) -> date:
+    text = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{value}'")
+
+
+def _build_row(when: date, amount: Decimal, description: str, category: str = None, type_: str = None) -> dict:
+    """Validates one statement line and turns it into a transaction dict."""
+    if when > date.today():
+        raise ValueError(f"Date {when} is in the future")
+    if amount == 0:
+        raise ValueError("Amount is zero")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"Amount {amount} is out of range")
+
+    if type_:
+        type_ = type_.strip().lower()
+        is_income = type_ in ("income", "credit", "cr", "deposit")
+        if not is_income and type_ not in ("expense", "debit", "dr", "payment"):
+            is_income = amount > 0
+    else:
+        is_income = amount > 0
+
+    return {
+        "amount": abs(amount).quantize(Decimal("0.01")),
+        "category": INCOME_CATEGORY if is_income else map_category(description, category),
+        "note": (description or "").strip()[:500],
+        "date": when,
+        "type": "income" if is_income else "expense",
+    }
+
+
+# ---------------- FORMAT READERS ----------------
+def parse_csv(stream):
+    """
+    Streams (line_number, row, error) tuples from a bank CSV export.
+    Accepts either a signed amount column or separate debit/credit columns.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        return
+    header = [h.strip().lower() for h in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = header.index(alias)
+                break
+
+    if "date" not in columns or not ("amount" in columns or "debit" in columns or "credit" in columns):
+        yield 1, None, "CSV needs a date column and an amount (or debit/credit) column"
+        return
+
+    def cell(values, field):
+        index = columns.get(field)
+        return values[index] if index is not None and index < len(values) else ""
+
+    for values in reader:
+        line_number = reader.line_num
+        if not any(v.strip() for v in values):
+            continue
+        try:
+            when = parse_date(cell(values, "date"))
+            if "amount" in columns:
+                amount = parse_amount(cell(values, "amount"))
+            else:
+                debit = parse_amount(cell(values, "debit"))
+                credit = parse_amount(cell(values, "credit"))
+                amount = credit if credit else (-abs(debit) if debit else None)
+            if amount is None:
+                raise ValueError("Missing amount")
+            row = _build_row(when, amount, cell(values, "note"), cell(values, "category"), cell(values, "type"))
+        except InvalidOperation:
+            yield line_number, None, "Invalid amount"
+            continue
+        except ValueError as e:
+            yield line_number, None, str(e)
+            continue
+        yield line_number, row, None
+
+
+def parse_ofx(stream, chunk_size=64 * 1024):
+    """
+    Streams (transaction_number, row, error) tuples from an OFX/QFX file.
+    Works for both SGML (OFX 1.x) and XML (OFX 2.x) layouts.
+    """
+    buffer = ""
+    number = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        consumed = 0
+        for match in _OFX_TRANSACTION.finditer(buffer):
+            consumed = match.end()
+            number += 1
+            fields = {k.upper(): v.strip() for k, v in _OFX_FIELD.findall(match.group(1))}
+            try:
+                when = parse_date(fields.get("DTPOSTED", "")[:8])
+                amount = parse_amount(fields.get("TRNAMT"))
+                if amount is None:
+                    raise ValueError("Missing TRNAMT")
+                description = " ".join(filter(None, [fields.get("NAME"), fields.get("MEMO")]))
+                row = _build_row(when, amount, description)
+            except InvalidOperation:
+                yield number, None, "Invalid amount"
+                continue
+            except ValueError as e:
+                yield number, None, str(e)
+                continue
+            yield number, row, None
+
+        buffer = buffer[consumed:]
+        # Only an unfinished <STMTTRN> block needs to be carried over to the next chunk
+        start = buffer.upper().rfind("<STMTTRN>")
+        buffer = buffer[start:] if start >= 0 else buffer[-len("<STMTTRN>"):]
+        if not chunk:
+            break
+
+
+# ---------------- IMPORT ----------------
+def import_statement(user_id, file, filename: str = "") -> dict:
+    """
+    Parses a CSV/OFX statement (binary file-like, e.g. a Streamlit UploadedFile)
+    and loads every valid row in a single database transaction.
+    Returns {"imported", "rejected", "errors", "seconds", "rows_per_second"}.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    is_ofx = filename.lower().endswith((".ofx", ".qfx"))
+    records = parse_ofx(text) if is_ofx else parse_csv(text)
+
+    errors = []
+
+    def valid_rows():
+        for number, row, error in records:
+            if error:
+                errors.append((number, error))
+                continue
+            yield row
+
+    start = time.perf_counter()
+    imported = bulk_add_transactions(user_id, valid_rows())
+    seconds = time.perf_counter() - start
+    rows_per_second = imported / seconds if seconds > 0 else 0.0
+
+    logging.info(
+        f"Imported {imported} transactions for user {user_id} from '{filename}' "
+        f"in {seconds:.2f}s ({rows_per_second:,.0f} rows/s, {len(errors)} rejected)"
+    )
+    return {
+        "imported": imported,
+        "rejected": len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_second": rows_per_second,
+    }
@@ -0,0 +1,44 @@
+# tests/test_llm_cache.py
+import os
+import pytest
+from benchmarks import replay_server
+
+
+@pytest.fixture(scope="module")
+def offline_app(tmp_path_factory):
+    """Scraper, LLM and databases pointed at the replay server and a temp dir. Must run before app imports."""
+    workdir = tmp_path_factory.mktemp("llm-cache")
+    server = replay_server.start(latency=0.0, llm_latency=0.05)
+    os.environ.update(
+        TROLLEY_BASE_URL=server.base_url,
+        HTTP_CACHE_DIR=str(workdir / "http"),
+        LLM_CACHE_PATH=str(workdir / "llm.db"),
+        OPENAI_API_KEY="replay",
+        OPENAI_BASE_URL=server.base_url + "/v1",
+        SCRAPER_RATE="1000",
+        SCRAPER_BURST="1000",
+    )
+    secrets = workdir / "secrets.toml"
+    secrets.write_text(f'DB_BACKEND = "sqlite"\nSQLITE_PATH = "{workdir / "app.db"}"\n')
+    from streamlit import config
+    config.set_option("secrets.files", [str(secrets)])
+
+    from database.database import init_db
+    from services import discounts_service, price_refresher
+    init_db()
+    price_refresher.refresh_prices(["cleaning", "groceries"])
+    yield server, discounts_service
+    server.shutdown()
+
+
+def test_identical_dashboard_loads_call_the_llm_once(offline_app):
+    server, discounts_service = offline_app
+    queries, weights = ["cleaning", "groceries"], {"cleaning": 0.25, "groceries": 0.75}
+
+    first = discounts_service.get_top_discounts(queries, None, weights)
+    # A later load, or another process: only the persistent LLM cache is left
+    discounts_service._get_top_discounts.clear()
+    second = discounts_service.get_top_discounts(queries, None, weights)
+
+    assert first and len(second) == len(first)
+    assert server.counts["llm"] == 1
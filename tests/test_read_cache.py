@@ -0,0 +1,34 @@
+# tests/test_read_cache.py
+from database.cache import ReadCache
+
+
+def _load(cache, user_id, key_name, loader):
+    key = (key_name, user_id, cache.version(user_id))
+    return cache.get_or_load(key, loader)
+
+
+def test_write_invalidates_user():
+    cache = ReadCache(max_rows=100)
+    assert _load(cache, 1, "rows", lambda: ["old"]) == ["old"]
+    cache.bump(1)
+    assert _load(cache, 1, "rows", lambda: ["new"]) == ["new"]
+
+
+def test_global_bump_does_not_revive_stale_reads():
+    cache = ReadCache(max_rows=100)
+    # A loader reads pre-write rows under the key of the current version...
+    stale_key = ("rows", 1, cache.version(1))
+    cache.bump(1)     # ...a write lands...
+    cache.bump(None)  # ...a full invalidation follows...
+    cache.get_or_load(stale_key, lambda: ["pre-write"])  # ...and the stale loader stores late
+    assert _load(cache, 1, "rows", lambda: ["current"]) == ["current"]
+
+
+def test_global_bump_invalidates_everyone():
+    cache = ReadCache(max_rows=100)
+    _load(cache, 1, "rows", lambda: ["a"])
+    _load(cache, 2, "rows", lambda: ["b"])
+    cache.bump()
+    assert _load(cache, 1, "rows", lambda: ["a2"]) == ["a2"]
+    assert _load(cache, 2, "rows", lambda: ["b2"]) == ["b2"]
+    assert cache.stats()["evictions"] == 0
@@ -1,13 +1,13 @@
 # utils/auth.py
 import streamlit as st
-from database.db_methods import create_user, verify_user
+from services.auth_service import register, authenticate
 
 def register_user(name, email, password):
-    user_id = create_user(name, email, password)
-    return user_id is not None
+    """Returns the new user id, None if the email is already registered, or False on a hashing timeout."""
+    return register(name, email, password)
 
 def login_user(email, password):
-    user = verify_user(email, password)
+    user = authenticate(email, password)
     if user:
         return True, user["name"], user["id"]
     return False, None, None
@@ -0,0 +1,129 @@
+# utils/circuit_breaker.py
+import logging
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive failures.
+
+    While open every call raises CircuitOpenError immediately. Recovery:
+      - with a `probe` (callable returning truthy when the dependency is healthy),
+        a background thread runs it every `reset_timeout` seconds and closes the
+        breaker on the first success; calls never pay for the probing.
+      - without one, after `reset_timeout` a single trial call is let through
+        (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, probe=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._prober = None
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (may start the half-open trial)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self.probe is None and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logging.info(f"Circuit '{self.name}' closed.")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def cancel(self):
+        """The call let through by allow() was abandoned without an outcome: frees the half-open trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        # Caller holds the lock
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._stats["opened"] += 1
+        logging.warning(f"Circuit '{self.name}' opened after {self._failures} failures.")
+        if self.probe is not None and (self._prober is None or not self._prober.is_alive()):
+            self._prober = threading.Thread(target=self._probe_until_healthy, name=f"probe-{self.name}", daemon=True)
+            self._prober.start()
+
+    def _probe_until_healthy(self):
+        while True:
+            time.sleep(self.reset_timeout)
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                logging.info(f"Circuit '{self.name}' probe failed: {str(e)}")
+                healthy = False
+            if healthy:
+                self.record_success()
+                return
+
+    def call(self, func, is_failure=None):
+        """
+        Runs func() through the breaker. Exceptions count as failures and are
+        re-raised; `is_failure(result)` can flag bad results (e.g. HTTP 5xx),
+        which are still returned to the caller.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        with self._lock:
+            self._stats["calls"] += 1
+        try:
+            result = func()
+        except Exception:
+            self.record_failure()
+            raise
+        if is_failure is not None and is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._state
+            stats["consecutive_failures"] = self._failures
+        return stats
@@ -0,0 +1,112 @@
+# utils/deals_prompt.py
+import json
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+# Whole prompt (template + summary + products), in tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", 2000))
+
+PRODUCT_COLUMNS = "id|category|title|store|price_gbp|drop_pct"
+
+_encoding = None
+_encoding_failed = False
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """tiktoken count for the model; ~4 characters per token if its encoding can't be loaded (offline)."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            _encoding_failed = True
+            logging.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _cell(value) -> str:
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def _row(product_id: str, product: dict) -> str:
+    return "|".join([
+        product_id,
+        _cell(product.get("category", "")),
+        _cell(product.get("title", "")),
+        _cell(product.get("store", "")),
+        _cell(product.get("best_price", "")),
+        _cell(product.get("drop_pct", 0)),
+    ])
+
+
+def prompt_fields(product: dict) -> dict:
+    """
+    The parts of a product the prompt or the resolved answer use; anything
+    else (e.g. deal_score, other_prices) stays out of the LLM cache key.
+    """
+    return {
+        "category": product.get("category", ""),
+        "title": product.get("title", ""),
+        "store": product.get("store", ""),
+        "best_price": product.get("best_price", ""),
+        "drop_pct": product.get("drop_pct", 0),
+        "store_link": product.get("store_link"),
+    }
+
+
+def compact_summary(user_summary) -> str:
+    return json.dumps(user_summary or {}, separators=(",", ":"), default=str)
+
+
+def build_product_table(products: list, fixed_tokens: int, budget: int = None):
+    """
+    Encodes products one per line with short ids, in the given order (callers
+    pass them best-first), until the budget is spent; duplicates of the same
+    title at the same store are skipped.
+
+    Returns (table text, {id: product} link table to resolve the answer
+    locally, products sent, tokens used by the table).
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    remaining = budget - fixed_tokens - count_tokens(PRODUCT_COLUMNS)
+    lines, links, sent, seen = [], {}, [], set()
+    for product in products:
+        identity = (product.get("title"), product.get("store"))
+        if identity in seen:
+            continue
+        product_id = f"p{len(links) + 1}"
+        row = _row(product_id, product)
+        cost = count_tokens(row) + 1  # + newline
+        if cost > remaining:
+            break
+        remaining -= cost
+        seen.add(identity)
+        lines.append(row)
+        links[product_id] = product
+        sent.append(product)
+    table = "\n".join(lines)
+    return table, links, sent, count_tokens(table)
+
+
+def resolve_selection(data: dict, links: dict) -> dict:
+    """Replaces the ids the model picked with the full products (store, title, price, link)."""
+    selected = []
+    for item in data.get("selected") or []:
+        if not isinstance(item, dict):
+            continue
+        product = links.get(str(item.get("id", "")).strip())
+        if product is None:
+            continue
+        selected.append({
+            "store": product.get("store"),
+            "title": product.get("title"),
+            "best_price": product.get("best_price"),
+            "store_link": product.get("store_link"),
+            "justification": item.get("justification", ""),
+        })
+    return {**data, "selected": selected}
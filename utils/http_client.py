@@ -0,0 +1,244 @@
+# utils/http_client.py
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+
+logging.basicConfig(level=logging.INFO)
+
+CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", Path(__file__).parent.parent / ".cache" / "http"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+# Disk cache bounds: entries unused for CACHE_MAX_AGE are dropped, then the
+# least recently used ones until the cache fits in CACHE_MAX_BYTES
+CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+CACHE_MAX_AGE = float(os.getenv("HTTP_CACHE_MAX_AGE", 7 * 86400))
+PRUNE_INTERVAL = float(os.getenv("HTTP_CACHE_PRUNE_INTERVAL", 300))
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0, "bytes_downloaded": 0, "evicted": 0}
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+class HttpResult:
+    """The parts of a response the scraper needs; `source` is "cache", "revalidated" or "network"."""
+
+    def __init__(self, status_code, content, source, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.source = source
+        self.headers = headers or {}
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session: one TCP+TLS connection pool per host."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+# ---------------- CACHE ENTRIES ----------------
+def _paths(url: str):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    return CACHE_DIR / f"{key}.json", CACHE_DIR / f"{key}.body"
+
+
+def _load(url: str):
+    meta_path, body_path = _paths(url)
+    try:
+        meta = json.loads(meta_path.read_text())
+        body = body_path.read_bytes()
+    except (OSError, ValueError):
+        return None, None
+    return meta, body
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_suffix(path.suffix + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _store(url: str, meta: dict, body: bytes = None):
+    meta_path, body_path = _paths(url)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        if body is not None:
+            _write_atomic(body_path, body)
+        _write_atomic(meta_path, json.dumps(meta).encode())
+    except OSError as e:
+        logging.warning(f"Could not write HTTP cache entry for {url}: {str(e)}")
+    _maybe_prune()
+
+
+def _touch(url: str):
+    """Marks an entry as used: the meta file's mtime is its LRU timestamp."""
+    try:
+        os.utime(_paths(url)[0])
+    except OSError:
+        pass
+
+
+def prune_cache(max_bytes: int = None, max_age: float = None) -> int:
+    """
+    Deletes entries not used for max_age seconds, then the least recently used
+    ones until the cache is under max_bytes, plus leftover temp files.
+    Returns the number of entries removed.
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = CACHE_MAX_AGE if max_age is None else max_age
+    now = time.time()
+    entries = []
+    try:
+        for path in CACHE_DIR.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.suffix == ".tmp" or (path.suffix == ".body" and not path.with_suffix(".json").exists()):
+                # Interrupted writes
+                if now - stat.st_mtime > 3600:
+                    path.unlink(missing_ok=True)
+            elif path.suffix == ".json":
+                body_path = path.with_suffix(".body")
+                try:
+                    size = stat.st_size + body_path.stat().st_size
+                except OSError:
+                    size = stat.st_size
+                entries.append((stat.st_mtime, size, path, body_path))
+    except OSError:
+        return 0
+
+    entries.sort()  # least recently used first
+    total = sum(size for _, size, _, _ in entries)
+    removed = 0
+    for used_at, size, meta_path, body_path in entries:
+        if now - used_at <= max_age and total <= max_bytes:
+            break
+        try:
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        _count("evicted", removed)
+        logging.info(f"HTTP cache pruned: {removed} entries removed, {total / 1024 / 1024:.1f} MB left.")
+    return removed
+
+
+def _maybe_prune():
+    """Prunes at most once per PRUNE_INTERVAL, by whichever writer gets there first."""
+    global _last_prune
+    if time.time() - _last_prune < PRUNE_INTERVAL or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _last_prune = time.time()
+        prune_cache()
+    finally:
+        _prune_lock.release()
+
+
+def _freshness(headers) -> tuple:
+    """
+    (cacheable, seconds the response stays fresh) from Cache-Control / Expires,
+    falling back to the usual 10%-of-age heuristic when only Last-Modified is sent.
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return False, 0
+    if "no-cache" in cache_control:
+        return True, 0
+    match = re.search(r"(?:s-maxage|max-age)=(\d+)", cache_control)
+    if match:
+        return True, int(match.group(1))
+
+    try:
+        now = time.time()
+        if headers.get("Expires"):
+            return True, max(0, parsedate_to_datetime(headers["Expires"]).timestamp() - now)
+        if headers.get("Last-Modified"):
+            age = now - parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+            return True, max(0, age * 0.1)
+    except (TypeError, ValueError):
+        pass
+    return True, 0
+
+
+def _count(field, amount=1):
+    with _stats_lock:
+        _stats[field] += amount
+
+
+# ---------------- PUBLIC API ----------------
+def get(url: str, headers: dict = None, timeout: float = 10) -> HttpResult:
+    """
+    Cached GET. Fresh entries are served from disk; stale entries with an ETag or
+    Last-Modified are revalidated (304 → served from disk); everything else goes
+    to the network over the shared keep-alive session.
+    """
+    meta, body = _load(url)
+    now = time.time()
+    if meta and now - meta["stored_at"] < meta["max_age"]:
+        _count("hits")
+        _count("bytes_saved", len(body))
+        _touch(url)
+        return HttpResult(meta["status"], body, "cache")
+
+    request_headers = dict(headers or {})
+    if meta:
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get_session().get(url, headers=request_headers, timeout=timeout)
+
+    if response.status_code == 304 and meta:
+        cacheable, max_age = _freshness(response.headers)
+        meta.update(stored_at=now, max_age=max_age if cacheable else 0)
+        meta["etag"] = response.headers.get("ETag", meta.get("etag"))
+        _store(url, meta)
+        _count("revalidated")
+        _count("bytes_saved", len(body))
+        return HttpResult(meta["status"], body, "revalidated")
+
+    _count("misses")
+    _count("bytes_downloaded", len(response.content))
+    if response.status_code == 200:
+        cacheable, max_age = _freshness(response.headers)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if cacheable and (max_age > 0 or etag or last_modified):
+            _store(url, {
+                "url": url,
+                "status": response.status_code,
+                "etag": etag,
+                "last_modified": last_modified,
+                "stored_at": now,
+                "max_age": max_age,
+            }, response.content)
+    return HttpResult(response.status_code, response.content, "network", response.headers)
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+    return stats
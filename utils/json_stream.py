@@ -0,0 +1,74 @@
+# utils/json_stream.py
+import json
+import re
+
+
+class ArrayItemStream:
+    """
+    Incremental parser for one array inside a streamed JSON completion, e.g.
+    the "selected" list of the deals answer. feed() takes the next chunk of
+    text and returns the array items whose JSON became complete with it, so
+    each item can be used before the rest of the completion arrives.
+    Text before the key (prose, code fences) is ignored.
+    """
+
+    def __init__(self, key: str):
+        self._key = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._text = ""
+        self._pos = 0            # next character to scan
+        self._in_array = False
+        self._done = False
+        self._depth = 0          # {}/[] nesting inside the array
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the array has been seen."""
+        return self._done
+
+    def feed(self, chunk: str) -> list:
+        if self._done or not chunk:
+            return []
+        self._text += chunk
+        if not self._in_array:
+            match = self._key.search(self._text)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        items = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # end of the array itself
+                    self._done = True
+                    self._pos = i + 1
+                    return items
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        pass  # malformed item: skipped, the full parse at the end decides
+                    self._item_start = None
+        self._pos = len(text)
+        return items
@@ -0,0 +1,144 @@
+# utils/llm_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+
+# Parsed LLM answers keyed by a hash of everything that determines them, in a
+# local SQLite file shared by every process on the machine.
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", Path(__file__).parent.parent / ".cache" / "llm" / "responses.db"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 6 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+
+_init_lock = threading.Lock()
+_initialised = False
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "rejected": 0, "saved_tokens": 0, "saved_seconds": 0.0}
+
+
+@contextmanager
+def _connect():
+    """Short-lived connection: commits on success, always closed."""
+    global _initialised
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(CACHE_PATH), timeout=5)
+    try:
+        if not _initialised:
+            with _init_lock:
+                if not _initialised:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS responses (
+                            key TEXT PRIMARY KEY,
+                            response TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            last_used REAL NOT NULL,
+                            tokens INTEGER NOT NULL DEFAULT 0,
+                            latency REAL NOT NULL DEFAULT 0
+                        )
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+                    conn.commit()
+                    _initialised = True
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _count(field, amount=1):
+    with _stats_lock:
+        _stats[field] += amount
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def make_key(model: str, temperature: float, prompt_template: str, products: list, summary) -> str:
+    """
+    Hash of the normalised inputs: product order and dict key order don't
+    matter, and editing the prompt template invalidates old answers.
+    """
+    normalised = {
+        "model": model,
+        "temperature": temperature,
+        "prompt": hashlib.sha256(prompt_template.encode()).hexdigest(),
+        "products": sorted(_canonical(p) for p in products),
+        "summary": summary or {},
+    }
+    return hashlib.sha256(_canonical(normalised).encode()).hexdigest()
+
+
+def get(key: str):
+    """The stored answer for key if younger than LLM_CACHE_TTL, else None."""
+    now = time.time()
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT response, tokens, latency FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - CACHE_TTL)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"LLM cache unavailable: {str(e)}")
+        return None
+
+    if not row:
+        _count("misses")
+        return None
+    _count("hits")
+    _count("saved_tokens", row[1])
+    _count("saved_seconds", row[2])
+    return json.loads(row[0])
+
+
+def put(key: str, response: dict, tokens: int = 0, latency: float = 0.0, validate=None):
+    """
+    Stores a parsed answer; `validate(response)` must pass, so malformed or
+    partial answers are never replayed. Evicts the least recently used entries
+    beyond LLM_CACHE_MAX_ENTRIES, and expired ones.
+    """
+    if validate is not None and not validate(response):
+        _count("rejected")
+        return
+    now = time.time()
+    try:
+        with _connect() as conn:
+            conn.execute("""
+                INSERT INTO responses (key, response, created_at, last_used, tokens, latency)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET response = excluded.response, created_at = excluded.created_at,
+                    last_used = excluded.last_used, tokens = excluded.tokens, latency = excluded.latency
+            """, (key, json.dumps(response), now, now, int(tokens or 0), float(latency)))
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - CACHE_TTL,))
+            conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (CACHE_MAX_ENTRIES,))
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Could not store LLM response: {str(e)}")
+        return
+    _count("stores")
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    try:
+        with _connect() as conn:
+            stats["entries"] = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    except (sqlite3.Error, OSError):
+        stats["entries"] = None
+    return stats
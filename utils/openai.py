@@ -3,9 +3,12 @@ import json
 import logging
 import re
 import os
+import time
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
+from utils import deals_prompt, llm_cache
+from utils.json_stream import ArrayItemStream
 
 # Upload .env variables
 load_dotenv()
@@ -22,82 +25,98 @@ llm = ChatOpenAI(
 )
 
 # --- Smart prompt ---
+# Products go in as a compact table with short ids (see utils/deals_prompt.py);
+# the model answers with ids and the links are filled in locally.
 PROMPT = PromptTemplate.from_template("""
-You are an AI expert in consumer savings.  
-You will analyze user spending behavior and scraped supermarket products to select the BEST value deals.
+You are an AI expert in consumer savings.
+Select the BEST value deals for this user from scraped supermarket products.
 
-USER SPENDING SUMMARY:
+USER SPENDING SUMMARY (JSON):
 {spending_summary}
 
-PRODUCT LIST (JSON):
-{products_json}
+PRODUCTS (one per line: {columns}), pre-ranked best deal first by price vs
+other stores, unit price, recent drops and the user's spend per category:
+{products_table}
 
 TASK:
-1. Identify the top 3 BEST DEALS based on:
+1. Pick the top 3 BEST DEALS based on:
    - Categories where user expenses INCREASED this month.
    - Price vs alternatives.
-   - Unit price (if present).
+   - drop_pct: % below the product's 30-day median price (0 when unknown).
+   - Unit price (if present in the title).
    - General consumer savings value.
 
 2. Output ONLY valid JSON using the structure:
+{{"selected": [{{"id": "p1", "justification": "..."}}], "analysis": "...", "confidence": 0.0}}
 
-{{
-  "selected": [
-    {{
-      "store": "...",
-      "title": "...",
-      "best_price": "...",
-      "store_link": "...",
-      "justification": "..."
-    }},
-    {{
-      "store": "...",
-      "title": "...",
-      "best_price": "...",
-      "store_link": "...",
-      "justification": "..."
-    }},
-    {{
-      "store": "...",
-      "title": "...",
-      "best_price": "...",
-      "store_link": "...",
-      "justification": "..."
-    }}
-  ],
-  "analysis": "...",
-  "confidence": 0.0
-}}
-
-If you cannot identify 3 deals, return as many as possible (minimum 1 if available). If none, return empty selected.
+Up to 3 items in "selected", best first. If none, return empty selected.
 """)
 
+def _valid_selection(data) -> bool:
+    """Only well-formed answers are cached: a dict whose "selected" is a non-empty list of product dicts."""
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("selected"), list)
+        and data["selected"]
+        and all(isinstance(item, dict) and item.get("title") for item in data["selected"])
+    )
+
+def build_prompt(products: list, user_summary: dict):
+    """
+    Deals prompt within LLM_PROMPT_TOKEN_BUDGET: the template and summary are
+    always sent, products are added best-first while they fit.
+    Returns (prompt, {id: product}, products sent, prompt tokens).
+    """
+    spending_summary = deals_prompt.compact_summary(user_summary)
+    empty = PROMPT.format(spending_summary=spending_summary, columns=deals_prompt.PRODUCT_COLUMNS, products_table="")
+    fixed_tokens = deals_prompt.count_tokens(empty)
+    table, links, sent, table_tokens = deals_prompt.build_product_table(products, fixed_tokens)
+    prompt = PROMPT.format(spending_summary=spending_summary, columns=deals_prompt.PRODUCT_COLUMNS, products_table=table)
+    return prompt, links, sent, fixed_tokens + table_tokens
+
 def analyze_products_with_llm(payload: dict) -> dict:
     """
     Envía productos + contexto al modelo gpt-4o-mini y retorna JSON parseado.
     Mantiene los nombres best_price y store_link para compatibilidad con Streamlit.
+    Identical inputs within LLM_CACHE_TTL are answered from utils/llm_cache.py.
     """
-    spending_summary = json.dumps(payload.get("user_summary", {}), indent=2)
-    products_json = json.dumps(payload.get("products", []), indent=2)
-    
+    products = payload.get("products", [])
+    user_summary = payload.get("user_summary", {})
+    prompt, links, sent, prompt_tokens = build_prompt(products, user_summary)
+    if not sent:
+        logging.warning("No products fit in the deals prompt budget.")
+        return None
+
+    cache_key = llm_cache.make_key(llm.model_name, llm.temperature, PROMPT.template,
+                                   [deals_prompt.prompt_fields(p) for p in sent], user_summary)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logging.info("LLM response served from cache.")
+        return cached
+
     try:
-        chain_input = {
-            "spending_summary": spending_summary,
-            "products_json": products_json
-        }
-        
-        response = llm.invoke(PROMPT.format(**chain_input)).content
-        
+        start = time.perf_counter()
+        message = llm.invoke(prompt)
+        latency = time.perf_counter() - start
+        response = message.content
+
+        usage = getattr(message, "usage_metadata", None) or {}
+        logging.info(
+            f"Deals prompt: {len(sent)}/{len(products)} products, ~{prompt_tokens} tokens estimated; "
+            f"usage in={usage.get('input_tokens', '?')} out={usage.get('output_tokens', '?')} in {latency:.2f}s"
+        )
+
         # Extraer solo JSON
         json_match = re.search(r'\{.*\}', response, re.DOTALL)
         if json_match:
             json_str = json_match.group(0)
-            data = json.loads(json_str)
+            data = deals_prompt.resolve_selection(json.loads(json_str), links)
+            llm_cache.put(cache_key, data, usage.get("total_tokens", 0), latency, validate=_valid_selection)
             return data
         else:
             logging.error("No JSON found in AI response.")
             return None
-    
+
     except json.JSONDecodeError:
         logging.error("No se pudo parsear JSON del modelo. Respuesta:")
         logging.error(response)
@@ -105,3 +124,64 @@ def analyze_products_with_llm(payload: dict) -> dict:
     except Exception as e:
         logging.exception(f"Error ejecutando la IA: {str(e)}")
         return None
+
+def stream_products_with_llm(payload: dict):
+    """
+    Streaming variant of analyze_products_with_llm: yields each selected deal
+    (store, title, best_price, store_link, justification) as soon as its JSON
+    object is complete in the completion. Cached answers are replayed at once.
+    Errors (including a reply that is not valid JSON) are raised to the caller
+    once the deals received so far have been yielded.
+    """
+    products = payload.get("products", [])
+    user_summary = payload.get("user_summary", {})
+    prompt, links, sent, prompt_tokens = build_prompt(products, user_summary)
+    if not sent:
+        logging.warning("No products fit in the deals prompt budget.")
+        return
+
+    cache_key = llm_cache.make_key(llm.model_name, llm.temperature, PROMPT.template,
+                                   [deals_prompt.prompt_fields(p) for p in sent], user_summary)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logging.info("LLM response served from cache.")
+        yield from cached["selected"]
+        return
+
+    parser = ArrayItemStream("selected")
+    chunks, usage = [], {}
+    start = time.perf_counter()
+    first_deal = None
+    try:
+        for chunk in llm.stream(prompt, stream_usage=True):
+            if getattr(chunk, "usage_metadata", None):
+                usage = chunk.usage_metadata
+            text = chunk.content if isinstance(chunk.content, str) else ""
+            chunks.append(text)
+            for item in parser.feed(text):
+                for deal in deals_prompt.resolve_selection({"selected": [item]}, links)["selected"]:
+                    if first_deal is None:
+                        first_deal = time.perf_counter() - start
+                    yield deal
+    except Exception as e:
+        logging.exception(f"Error ejecutando la IA (stream): {str(e)}")
+        raise
+
+    latency = time.perf_counter() - start
+    logging.info(
+        f"Deals prompt (stream): {len(sent)}/{len(products)} products, ~{prompt_tokens} tokens estimated; "
+        f"usage in={usage.get('input_tokens', '?')} out={usage.get('output_tokens', '?')}; "
+        f"first deal {first_deal if first_deal is not None else float('nan'):.2f}s, done {latency:.2f}s"
+    )
+
+    # The whole answer is validated before caching, as in the blocking call
+    json_match = re.search(r'\{.*\}', "".join(chunks), re.DOTALL)
+    try:
+        data = json.loads(json_match.group(0)) if json_match else None
+    except json.JSONDecodeError:
+        data = None
+    if data is None:
+        # Raised so callers count it against the LLM, like a failed request
+        raise ValueError("Streamed AI response was not valid JSON")
+    llm_cache.put(cache_key, deals_prompt.resolve_selection(data, links), usage.get("total_tokens", 0), latency,
+                  validate=_valid_selection)
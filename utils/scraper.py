@@ -1,9 +1,19 @@
 # scraper.py
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import collections
+import heapq
+import itertools
 import random
 import logging
+import os
 import re
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from cachetools import TTLCache
+from utils import http_client
+from utils.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
 
 logging.basicConfig(level=logging.INFO)
 
@@ -11,138 +21,601 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
-def get_products_by_categories(categories: list) -> list:
+# Point at benchmarks/replay_server.py to scrape offline
+BASE_URL = os.getenv("TROLLEY_BASE_URL", "https://www.trolley.co.uk").rstrip("/")
+REQUEST_TIMEOUT = 10
+
+# --- Concurrency settings ---
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", 16))
+MAX_REQUESTS_PER_HOST = int(os.getenv("SCRAPER_MAX_PER_HOST", 6))
+BATCH_DEADLINE = float(os.getenv("SCRAPER_BATCH_DEADLINE", 15))
+
+# --- Circuit breaker: stop hitting a failing host, probe it in the background ---
+BREAKER_FAILURES = int(os.getenv("SCRAPER_BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("SCRAPER_BREAKER_RESET", 30))
+PROBE_TIMEOUT = float(os.getenv("SCRAPER_PROBE_TIMEOUT", 3))
+
+# --- Dedup settings ---
+# Parsed store prices per product href, shared across categories, batches and sessions
+PRODUCT_CACHE_TTL = float(os.getenv("SCRAPER_PRODUCT_CACHE_TTL", 300))
+PRODUCT_CACHE_SIZE = int(os.getenv("SCRAPER_PRODUCT_CACHE_SIZE", 2048))
+
+_executor = ThreadPoolExecutor(max_workers=SCRAPER_WORKERS, thread_name_prefix="scraper")
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+_breakers = {}
+_product_cache = TTLCache(maxsize=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+_product_cache_lock = threading.Lock()
+_product_cache_stats = {"hits": 0, "misses": 0}
+
+def _host_limit(url: str) -> threading.Semaphore:
+    host = urlsplit(url).netloc
+    with _host_limits_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        return _host_limits[host]
+
+
+def _breaker(url: str) -> CircuitBreaker:
+    parts = urlsplit(url)
+    root = f"{parts.scheme}://{parts.netloc}/"
+
+    def probe():
+        return http_client.get_session().head(root, headers=HEADERS, timeout=PROBE_TIMEOUT).status_code < 500
+
+    with _host_limits_lock:
+        if parts.netloc not in _breakers:
+            _breakers[parts.netloc] = CircuitBreaker(
+                parts.netloc, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, probe=probe
+            )
+        return _breakers[parts.netloc]
+
+
+def _fetch(url: str):
     """
-    Para cada categoría:
-        - Scrapea 10 productos
-        - Selecciona 5 al azar
-        - Añade la categoría
-    Retorna lista total (5 por categoría).
+    GET through the shared keep-alive HTTP cache, with the per-host concurrency
+    limit applied. Errors and 5xx responses count against the host's breaker;
+    while it is open this raises CircuitOpenError.
     """
-    base_url = "https://www.trolley.co.uk/search/?from=search&q="
-    final_list = []
-
-    for category in categories:
-        formatted_query = category.replace(" ", "+")
-        url = base_url + formatted_query
+    def request():
+        with _host_limit(url):
+            return http_client.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+
+    return _breaker(url).call(request, is_failure=lambda r: r.status_code >= 500)
+
+
+def site_available() -> bool:
+    """False while the breaker for BASE_URL is open: batches return nothing without trying."""
+    return _breaker(BASE_URL).state != OPEN
+
+
+# ---------------- CRAWL SCHEDULER ----------------
+# Every page request goes through one scheduler per process:
+#   - a token bucket per host caps the request rate (SCRAPER_RATE/s, bursts of SCRAPER_BURST)
+#   - pages a user is waiting for jump ahead of background refreshes
+#   - 429/5xx responses are retried with exponential backoff (or Retry-After);
+#     a 429 also pauses the whole host
+#   - the same URL requested twice while queued or running is fetched once
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+RATE_PER_HOST = float(os.getenv("SCRAPER_RATE", 2))
+BURST_PER_HOST = float(os.getenv("SCRAPER_BURST", 6))
+MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", 2))
+RETRY_BACKOFF = float(os.getenv("SCRAPER_RETRY_BACKOFF", 1.0))
+MAX_BACKOFF = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`. Not thread-safe: the scheduler's lock guards it."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def try_take(self, now: float) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class _Job:
+    def __init__(self, url, handle, priority, seq):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.handle = handle
+        self.priority = priority
+        self.seq = seq
+        self.future = Future()
+        self.attempts = 0
+        self.waiters = 1
+        self.queued_at = time.monotonic()
+        self.state = "queued"  # queued → running (→ delayed → queued) → done
+        # Nobody waits for it any more. The future can't be cancelled once the
+        # first attempt started, so the scheduler checks this flag instead
+        self.cancelled = False
+
+
+def _retry_after(response, attempt: int) -> float:
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return min(MAX_BACKOFF, float(value))
+        except ValueError:
+            pass
+    return min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class CrawlScheduler:
+    def __init__(self, executor, rate=RATE_PER_HOST, burst=BURST_PER_HOST, max_retries=MAX_RETRIES):
+        self._executor = executor
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._ready = []    # heap of (priority, seq, job); stale entries are skipped
+        self._delayed = []  # heap of (not_before, seq, job) waiting to be retried
+        self._jobs = {}     # url → job not finished yet
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._thread = None
+        self._completed = collections.deque()  # monotonic times of finished pages, last minute
+        self._stats = {"submitted": 0, "coalesced": 0, "dropped": 0, "requests": 0,
+                       "retries": 0, "throttled": 0, "server_errors": 0, "failed": 0, "completed": 0}
+        self._host_stats = collections.defaultdict(lambda: {"requests": 0, "throttled": 0, "queue_seconds": 0.0})
+
+    def submit(self, url: str, handle, priority=PRIORITY_INTERACTIVE) -> Future:
+        """Queues GET url; the future resolves to handle(response), run on a scraper thread."""
+        with self._cond:
+            self._stats["submitted"] += 1
+            job = self._jobs.get(url)
+            if job is not None:
+                job.waiters += 1
+                job.cancelled = False
+                self._stats["coalesced"] += 1
+                if priority < job.priority:
+                    job.priority = priority
+                    if job.state == "queued":
+                        heapq.heappush(self._ready, (priority, job.seq, job))
+                return job.future
+
+            job = _Job(url, handle, priority, next(self._seq))
+            self._jobs[url] = job
+            heapq.heappush(self._ready, (priority, job.seq, job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="crawl-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return job.future
+
+    def release(self, url: str, future: Future):
+        """
+        A waiter gave up (deadline). Jobs nobody waits for any more are dropped:
+        at once if queued or waiting to be retried, after the request if running.
+        """
+        with self._cond:
+            job = self._jobs.get(url)
+            if job is None or job.future is not future:
+                return
+            job.waiters -= 1
+            if job.waiters > 0:
+                return
+            job.cancelled = True
+            if job.state not in ("queued", "delayed"):
+                return
+            self._drop(job)
+        self._cancel_future(job)
+
+    def _drop(self, job: _Job):
+        # Caller holds the lock; stale heap entries are skipped by the dispatcher
+        job.state = "done"
+        if self._jobs.get(job.url) is job:
+            del self._jobs[job.url]
+        self._stats["dropped"] += 1
+
+    @staticmethod
+    def _cancel_future(job: _Job):
+        # Still pending before the first attempt; afterwards it is already running
+        if not job.future.cancel():
+            job.future.set_exception(CancelledError(f"Dropped: nobody waits for {job.url}"))
+
+    def _bucket(self, host) -> TokenBucket:
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    def _take_ready(self, now: float):
+        """
+        Pops the most urgent queued job whose host has a token and takes the
+        token. Returns (job, None), or (None, seconds until a blocked host has
+        one) so a rate-limited host doesn't hold up pages for the others.
+        """
+        skipped, blocked, wait_time = [], set(), None
+        try:
+            while self._ready:
+                entry = heapq.heappop(self._ready)
+                priority, _, job = entry
+                if job.state != "queued" or job.cancelled or job.priority != priority:
+                    continue  # stale: re-prioritised, dropped or running
+                if job.host not in blocked:
+                    host_wait = self._bucket(job.host).try_take(now)
+                    if host_wait == 0:
+                        return job, None
+                    blocked.add(job.host)
+                    wait_time = host_wait if wait_time is None else min(wait_time, host_wait)
+                skipped.append(entry)
+            return None, wait_time
+        finally:
+            for entry in skipped:
+                heapq.heappush(self._ready, entry)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self._delayed)
+                    if job.state == "delayed" and not job.cancelled:
+                        job.state = "queued"
+                        job.queued_at = now
+                        heapq.heappush(self._ready, (job.priority, job.seq, job))
+
+                job, wait_time = self._take_ready(now)
+                if job is None:
+                    # Re-evaluated on wake-up: a more urgent page may have arrived meanwhile
+                    next_retry = self._delayed[0][0] - now if self._delayed else None
+                    timeouts = [t for t in (wait_time, next_retry) if t is not None]
+                    self._cond.wait(min(timeouts) if timeouts else None)
+                    continue
+                job.state = "running"
+                self._host_stats[job.host]["queue_seconds"] += now - job.queued_at
+                if job.attempts == 0 and not job.future.set_running_or_notify_cancel():
+                    job.state = "done"
+                    del self._jobs[job.url]
+                    continue
+            self._executor.submit(self._run, job)
 
+    def _run(self, job: _Job):
+        with self._cond:
+            self._stats["requests"] += 1
+            self._host_stats[job.host]["requests"] += 1
         try:
-            response = requests.get(url, headers=HEADERS, timeout=10)
-            if response.status_code != 200:
-                logging.error(f"Error HTTP {response.status_code} en {url}")
-                continue
+            response = _fetch(job.url)
+            if response.status_code in RETRY_STATUSES:
+                with self._cond:
+                    self._stats["throttled" if response.status_code == 429 else "server_errors"] += 1
+                    if response.status_code == 429:
+                        self._host_stats[job.host]["throttled"] += 1
+                if job.attempts < self.max_retries:
+                    self._retry(job, response)
+                    return
+            result = job.handle(response)
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _retry(self, job: _Job, response):
+        delay = _retry_after(response, job.attempts)
+        with self._cond:
+            if response.status_code == 429:
+                self._bucket(job.host).pause(delay)
+            dropped = job.cancelled
+            if dropped:
+                # Released while the request ran: don't spend more of the rate limit on it
+                self._drop(job)
+            else:
+                job.attempts += 1
+                job.state = "delayed"
+                self._stats["retries"] += 1
+                heapq.heappush(self._delayed, (time.monotonic() + delay, job.seq, job))
+                self._cond.notify()
+        if dropped:
+            self._cancel_future(job)
+            return
+        logging.info(f"HTTP {response.status_code} on {job.url}, retry {job.attempts} in {delay:.1f}s")
+
+    def _finish(self, job: _Job, result=None, error=None):
+        with self._cond:
+            job.state = "done"
+            if self._jobs.get(job.url) is job:
+                del self._jobs[job.url]
+            now = time.monotonic()
+            self._completed.append(now)
+            while self._completed and self._completed[0] < now - 60:
+                self._completed.popleft()
+            self._stats["failed" if error is not None else "completed"] += 1
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            queued = [j for j in self._jobs.values() if j.state == "queued"]
+            stats["queued_interactive"] = sum(1 for j in queued if j.priority == PRIORITY_INTERACTIVE)
+            stats["queued_background"] = len(queued) - stats["queued_interactive"]
+            stats["delayed"] = sum(1 for j in self._jobs.values() if j.state == "delayed")
+            stats["running"] = sum(1 for j in self._jobs.values() if j.state == "running")
+            now = time.monotonic()
+            stats["pages_last_minute"] = sum(1 for t in self._completed if t >= now - 60)
+            stats["hosts"] = {host: dict(h) for host, h in self._host_stats.items()}
+        return stats
+
+
+_scheduler = CrawlScheduler(_executor)
+
+
+def _collect(futures: dict, deadline: float) -> dict:
+    """
+    Waits for {key: (url, future)} and returns {key: result} for every page
+    handled before the deadline. The rest are released (dropped from the
+    queue if nobody else wants them) so the batch costs at most `deadline`.
+    """
+    if not futures:
+        return {}
+    done, pending = wait([f for _, f in futures.values()], timeout=deadline)
+    if pending:
+        for url, future in futures.values():
+            if future in pending:
+                _scheduler.release(url, future)
+        logging.warning(f"Scraping deadline of {deadline:.1f}s hit: {len(pending)}/{len(futures)} requests unfinished.")
+
+    results = {}
+    rejected = 0
+    for key, (url, future) in futures.items():
+        if future not in done or future.cancelled():
+            continue
+        try:
+            results[key] = future.result()
+        except CircuitOpenError:
+            rejected += 1
+        except Exception as e:
+            logging.error(f"Error inesperado en {key}: {str(e)}")
+    if rejected:
+        logging.warning(f"{rejected}/{len(futures)} requests skipped: circuit open.")
+    return results
 
-            soup = BeautifulSoup(response.content, "html.parser")
-            items = soup.find_all("div", class_="product-item")
 
-            if not items:
-                logging.warning(f"There are no productos for '{category}'")
-                continue
+# ---------------- PARSING ----------------
+# lxml (C) when installed, otherwise the pure-Python stdlib parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
-            # Tomar solo 10
-            items = items[:10]
+# Only these subtrees are built into the soup, the rest of each page is skipped
+SEARCH_PAGE_STRAINER = SoupStrainer("div", class_="product-item")
+PRODUCT_PAGE_STRAINER = SoupStrainer("div", class_="comparison-table")
 
-            extracted = []
-            for item in items:
-                info = item.find("div", class_="_info")
-                if not info:
-                    continue
 
-                brand = info.find("div", class_="_brand")
-                title = info.find("div", class_="_desc")
-                link = item.find("a")
+def _make_soup(content: bytes, strainer: SoupStrainer = None) -> BeautifulSoup:
+    return BeautifulSoup(content, HTML_PARSER, parse_only=strainer)
 
-                href = link["href"] if link and link.get("href") else None
 
-                extracted.append({
-                    #"brand": brand.get_text(strip=True) if brand else "Unknown",
-                    "title": title.get_text(strip=True) if title else "No title",
-                    "href": href,
-                    "category": category
-                })
+def _parse_search_page(content: bytes, category: str) -> list:
+    return _extract_products(_make_soup(content, SEARCH_PAGE_STRAINER), category)
 
-            # Seleccionar 5 al azar
-            selected = random.sample(extracted, min(5, len(extracted)))
-            final_list.extend(selected)
 
-        except Exception as e:
-            logging.error(f"Error inesperado en categoría {category}: {str(e)}")
-            continue
+def _parse_product_page(content: bytes):
+    return _extract_store_entries(_make_soup(content, PRODUCT_PAGE_STRAINER))
 
-    return final_list
 
+def _extract_products(soup: BeautifulSoup, category: str) -> list:
+    """Devuelve hasta 10 productos (title, href, category) de una página de búsqueda."""
+    items = soup.find_all("div", class_="product-item")
 
-def get_best_store_info(products: list) -> list:
-    """
-    Va a cada href y obtiene la tienda con el precio más bajo.
-    """
-    base_url = "https://www.trolley.co.uk"
+    if not items:
+        logging.warning(f"There are no productos for '{category}'")
+        return []
 
-    for product in products:
-        href = product.get("href")
-        if not href:
-            product["store"] = None
-            product["best_price"] = None
-            product["store_link"] = None
+    # Tomar solo 10
+    items = items[:10]
+
+    extracted = []
+    for item in items:
+        info = item.find("div", class_="_info")
+        if not info:
             continue
 
-        product_url = base_url + href
+        brand = info.find("div", class_="_brand")
+        title = info.find("div", class_="_desc")
+        link = item.find("a")
 
-        try:
-            response = requests.get(product_url, headers=HEADERS, timeout=10)
-            if response.status_code != 200:
-                continue
+        href = link["href"] if link and link.get("href") else None
 
-            soup = BeautifulSoup(response.content, "html.parser")
+        extracted.append({
+            #"brand": brand.get_text(strip=True) if brand else "Unknown",
+            "title": title.get_text(strip=True) if title else "No title",
+            "href": href,
+            "category": category
+        })
+    return extracted
 
-            table = soup.find("div", class_="comparison-table")
-            if not table:
-                continue
 
-            items = table.find_all("div", class_="_item")
+def _extract_store_entries(soup: BeautifulSoup):
+    """Devuelve la lista de tiendas (store, price, link) de la tabla comparativa, o None si no hay tabla."""
+    table = soup.find("div", class_="comparison-table")
+    if not table:
+        return None
 
-            store_entries = []
+    items = table.find_all("div", class_="_item")
 
-            for it in items:
-                # -------- STORE NAME ----------
-                svg = it.find("svg")
-                store_name = svg.get("title") if svg and svg.get("title") else "Unknown"
+    store_entries = []
 
-                # -------- PRICE ---------------
-                price_box = it.find("div", class_="_price")
-                if not price_box:
-                    continue
-                price_text = price_box.get_text(" ", strip=True)
-                match = re.search(r"([0-9]+\.?[0-9]*)", price_text)
-                if not match:
-                    continue
-                price_val = float(match.group(1))
-
-                # -------- VISIT LINK ----------
-                # Buscar cualquier botón con texto VISIT
-                visit_btn = it.find("a", string=lambda t: t and "visit" in t.lower())
-                visit_link = visit_btn["href"] if visit_btn and visit_btn.get("href") else None
-                store_entries.append({
-                    "store": store_name,
-                    "price": price_val,
-                    "link": visit_link
-                })
-            
-            # Elegir el más barato
-            if store_entries:
-                best_item = min(store_entries, key=lambda x: x["price"])
-                product["store"] = best_item["store"]
-                product["best_price"] = best_item["price"]
-                product["store_link"] = best_item["link"]
-                product.pop("href", None)  # Limpiar href innecesario
-            else:
-                product["store"] = None
-                product["best_price"] = None
-                product["store_link"] = None
+    for it in items:
+        # -------- STORE NAME ----------
+        svg = it.find("svg")
+        store_name = svg.get("title") if svg and svg.get("title") else "Unknown"
 
-        except Exception as e:
-            logging.error(f"Error procesando {product_url}: {str(e)}")
+        # -------- PRICE ---------------
+        price_box = it.find("div", class_="_price")
+        if not price_box:
+            continue
+        price_text = price_box.get_text(" ", strip=True)
+        match = re.search(r"([0-9]+\.?[0-9]*)", price_text)
+        if not match:
             continue
+        price_val = float(match.group(1))
+
+        # -------- VISIT LINK ----------
+        # Buscar cualquier botón con texto VISIT
+        visit_btn = it.find("a", string=lambda t: t and "visit" in t.lower())
+        visit_link = visit_btn["href"] if visit_btn and visit_btn.get("href") else None
+        store_entries.append({
+            "store": store_name,
+            "price": price_val,
+            "link": visit_link
+        })
+    return store_entries
+
+
+# ---------------- PUBLIC API ----------------
+def get_products_by_categories(categories: list, deadline: float = None, sample: int = 5,
+                               priority: int = PRIORITY_INTERACTIVE) -> list:
+    """
+    Para cada categoría (en paralelo):
+        - Scrapea 10 productos
+        - Selecciona `sample` al azar (todos si sample es None)
+        - Añade la categoría
+    Retorna lista total. Las categorías que no terminan antes del deadline se omiten.
+    """
+    if not site_available():
+        logging.warning("Skipping category scrape: trolley.co.uk circuit is open.")
+        return []
+    base_url = BASE_URL + "/search/?from=search&q="
+
+    def handle(response, category, url):
+        if response.status_code != 200:
+            logging.error(f"Error HTTP {response.status_code} en {url}")
+            return []
+        return _parse_search_page(response.content, category)
+
+    futures = {}
+    for category in categories:
+        url = base_url + category.replace(" ", "+")
+        futures[category] = (url, _scheduler.submit(url, lambda r, c=category, u=url: handle(r, c, u), priority))
+    results = _collect(futures, BATCH_DEADLINE if deadline is None else deadline)
+
+    final_list = []
+    for category in categories:
+        extracted = [dict(p) for p in results.get(category, [])]  # shared with coalesced callers
+        if sample is not None:
+            # Seleccionar al azar
+            extracted = random.sample(extracted, min(sample, len(extracted)))
+        final_list.extend(extracted)
+    return final_list
+
+
+def get_store_prices(hrefs, deadline: float = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """
+    Scrapea las páginas de producto en paralelo.
+    Retorna {href: [{"store", "price", "link"}, ...]}; los hrefs que fallan,
+    no tienen tabla comparativa o no llegan antes del deadline no aparecen.
+    """
+    def handle(response, href):
+        if response.status_code != 200:
+            return None
+        entries = _parse_product_page(response.content)
+        if entries is not None:
+            with _product_cache_lock:
+                _product_cache[href] = entries
+        return entries
+
+    # Each href once per batch, and not at all if a recent batch already got it
+    prices, missing = {}, []
+    with _product_cache_lock:
+        for href in set(hrefs):
+            if not href:
+                continue
+            entries = _product_cache.get(href)
+            if entries is None:
+                missing.append(href)
+            else:
+                prices[href] = entries
+        _product_cache_stats["hits"] += len(prices)
+        _product_cache_stats["misses"] += len(missing)
+
+    if missing and not site_available():
+        logging.warning(f"Skipping {len(missing)} product pages: trolley.co.uk circuit is open.")
+        return prices
+
+    futures = {
+        href: (BASE_URL + href, _scheduler.submit(BASE_URL + href, lambda r, h=href: handle(r, h), priority))
+        for href in missing
+    }
+    results = _collect(futures, BATCH_DEADLINE if deadline is None else deadline)
+    prices.update((href, entries) for href, entries in results.items() if entries is not None)
+    return prices
+
+
+def dedup_stats() -> dict:
+    """Product cache hits/misses and how many page requests were shared with a queued/running one."""
+    with _product_cache_lock:
+        stats = {f"product_cache_{k}": v for k, v in _product_cache_stats.items()}
+        stats["product_cache_size"] = len(_product_cache)
+    stats["fetch_coalesced"] = _scheduler.stats()["coalesced"]
+    return stats
+
+
+def crawl_stats() -> dict:
+    """Scheduler metrics: queue depth per priority, requests, retries, 429s, pages fetched in the last minute..."""
+    return _scheduler.stats()
+
+
+def breaker_stats() -> dict:
+    with _host_limits_lock:
+        breakers = dict(_breakers)
+    return {host: breaker.stats() for host, breaker in breakers.items()}
+
+
+def apply_best_store(product: dict, store_entries: list) -> dict:
+    """Rellena store/best_price/store_link con la tienda más barata (y other_prices con el resto)."""
+    if store_entries:
+        best_item = min(store_entries, key=lambda x: x["price"])
+        product["store"] = best_item["store"]
+        product["best_price"] = best_item["price"]
+        product["store_link"] = best_item["link"]
+        product["other_prices"] = sorted(e["price"] for e in store_entries if e is not best_item)
+        product.pop("href", None)  # Limpiar href innecesario
+    else:
+        product["store"] = None
+        product["best_price"] = None
+        product["store_link"] = None
+        product["other_prices"] = []
+    return product
+
+
+def get_best_store_info(products: list, deadline: float = None) -> list:
+    """
+    Va a cada href (en paralelo) y obtiene la tienda con el precio más bajo.
+    Los productos cuya página no llega antes del deadline se devuelven sin tienda.
+    """
+    results = get_store_prices([p.get("href") for p in products], deadline)
+
+    for product in products:
+        href = product.get("href")
+        if not href:
+            apply_best_store(product, [])
+        elif href in results:
+            apply_best_store(product, results[href])
+        # else: failed, no comparison table or past the deadline
 
     return products
 
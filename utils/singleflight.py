@@ -0,0 +1,169 @@
+# utils/singleflight.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process flights
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+
+MAX_TRACKED_KEYS = 256  # per-key metrics kept for the most recent keys
+
+
+class SingleFlight:
+    """
+    Collapses concurrent requests with the same key into one piece of work:
+    the first caller starts it, callers arriving while it runs get the same
+    handle and wait on it. Nothing is kept once the work finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+        self._key_stats = OrderedDict()
+
+    def _count(self, key, leader: bool):
+        # Caller holds the lock
+        self._stats["calls"] += 1
+        self._stats["executions" if leader else "shared"] += 1
+        name = str(key)
+        per_key = self._key_stats.pop(name, None) or {"calls": 0, "executions": 0, "coalesced": 0}
+        per_key["calls"] += 1
+        per_key["executions" if leader else "coalesced"] += 1
+        self._key_stats[name] = per_key
+        if len(self._key_stats) > MAX_TRACKED_KEYS:
+            self._key_stats.popitem(last=False)
+
+    def join(self, key, start):
+        """
+        For work that runs elsewhere (e.g. an executor): returns (handle,
+        leader) with the in-flight handle for `key`, or the one `start()`
+        creates. A handle is a Future, or anything with add_done_callback();
+        it is forgotten once done, and each caller waits on it with its own
+        timeout.
+        """
+        with self._lock:
+            handle = self._calls.get(key)
+            leader = handle is None
+            if leader:
+                handle = self._calls[key] = start()
+            self._count(key, leader)
+        if leader:
+            # Outside the lock: the callback runs at once if the work already finished
+            handle.add_done_callback(lambda _: self._forget(key, handle))
+        return handle, leader
+
+    def _forget(self, key, handle):
+        with self._lock:
+            if self._calls.get(key) is handle:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+    def key_stats(self) -> dict:
+        """{key: {"calls", "executions", "coalesced"}} for the most recent keys."""
+        with self._lock:
+            return {key: dict(value) for key, value in self._key_stats.items()}
+
+
+class FileSingleFlight:
+    """
+    Cross-process single flight on one machine (several Streamlit processes or
+    workers): an exclusive fcntl lock per key picks the process that runs the
+    function; the others wait for the lock and take the JSON result it leaves
+    behind. Results younger than `share_window` seconds are reused outright,
+    so a process arriving just after the leader finished doesn't repeat the
+    work. Without fcntl (Windows) func() just runs.
+    """
+
+    def __init__(self, directory, share_window: float = 60.0, poll_interval: float = 0.05):
+        self.directory = Path(directory)
+        self.share_window = share_window
+        self.poll_interval = poll_interval
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    def _paths(self, key):
+        name = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:32]
+        return self.directory / f"{name}.lock", self.directory / f"{name}.json"
+
+    def _count(self, field):
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def _shared_result(self, result_path: Path):
+        """(True, result) if the stored result is recent enough, else (False, None)."""
+        try:
+            stored = json.loads(result_path.read_text())
+        except (OSError, ValueError):
+            return False, None
+        if time.time() - stored.get("at", 0) > self.share_window:
+            return False, None
+        return True, stored.get("result")
+
+    def _store(self, result_path: Path, result):
+        tmp = result_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(json.dumps({"at": time.time(), "result": result}))
+            os.replace(tmp, result_path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not share single-flight result: {str(e)}")
+
+    def do(self, key, func, timeout: float = None):
+        """
+        Returns func() for `key`, run by at most one process at a time; the
+        result must be JSON serialisable to be shared. Waiting for another
+        process gives up after `timeout` seconds with TimeoutError.
+        """
+        self._count("calls")
+        if fcntl is None:
+            self._count("executions")
+            return func()
+        lock_path, result_path = self._paths(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            lock_file = open(lock_path, "a")
+        except OSError as e:
+            logging.warning(f"Single-flight lock unavailable, running locally: {str(e)}")
+            self._count("executions")
+            return func()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out waiting for in-flight call {key!r} in another process")
+                    time.sleep(self.poll_interval)
+
+            # Holding the lock: another process may have just produced the result
+            fresh, result = self._shared_result(result_path)
+            if fresh:
+                self._count("shared")
+                return result
+            self._count("executions")
+            result = func()
+            self._store(result_path, result)
+            return result
+        finally:
+            lock_file.close()  # releases the lock
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)